@@ -1,51 +1,17 @@
 import os
-import requests
-from elasticsearch import Elasticsearch
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
-from tools.codeowners import (
-    parse_codeowners,
-    fetch_codeowners,
-    get_owners_for_files
-)
+from agents.agent_client import call_agent
+from pipeline.pr_context import PRContext
 
 load_dotenv()
 
 # ─────────────────────────────────────────
 # ENV
 # ─────────────────────────────────────────
-GITHUB_TOKEN   = os.getenv("GITHUB_TOKEN")
 REPO           = os.getenv("GITHUB_REPO")          # owner/repo
-AGENT_API_URL  = os.getenv("ELASTIC_AGENT_URL")    # Agent Builder endpoint
-ELASTIC_CLOUD_ID = os.getenv("ELASTIC_CLOUD_ID")
-ELASTIC_API_KEY  = os.getenv("ELASTIC_API_KEY")
 
-es = Elasticsearch(
-    cloud_id=ELASTIC_CLOUD_ID,
-    api_key=ELASTIC_API_KEY
-)
-
-HEADERS = {
-    "Authorization": f"Bearer {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
-
-# ─────────────────────────────────────────
-# GITHUB FETCHERS
-# ─────────────────────────────────────────
-def get_issue(issue_number):
-    url = f"https://api.github.com/repos/{REPO}/issues/{issue_number}"
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-    return r.json()
-
-def get_pr_files(pr_number):
-    url = f"https://api.github.com/repos/{REPO}/pulls/{pr_number}/files"
-    r = requests.get(url, headers=HEADERS)
-    if r.status_code == 404:
-        print(f"  PR #{pr_number} not found, skipping file lookup")
-        return []
-    r.raise_for_status()
-    return [f["filename"] for f in r.json()]
+es = lazy_client("search")
 
 # ─────────────────────────────────────────
 # PROMPT BUILDER
@@ -91,60 +57,30 @@ Return a concise, structured maintainer-ready summary with:
 
     return prompt.strip()
 
-# ─────────────────────────────────────────
-# AGENT CALL (FIXED)
-# ─────────────────────────────────────────
-def call_agent(prompt):
-    payload = {
-        "input": prompt,
-        "agent_id": "context_retriever"
-    }
-
-    r = requests.post(
-        AGENT_API_URL,
-        headers={
-            "Authorization": f"ApiKey {ELASTIC_API_KEY}",
-            "Content-Type": "application/json",
-            "kbn-xsrf": "true"
-        },
-        json=payload,
-        timeout=300
-    )
-
-    if not r.ok:
-        print(f"Agent API error {r.status_code}: {r.text[:500]}")
-
-    r.raise_for_status()
-    return r.json()
-
 # ─────────────────────────────────────────
 # MAIN WORKFLOW
 # ─────────────────────────────────────────
-def process_issue(issue_number, is_pr=False):
+def process_issue(issue_number, is_pr=False, context=None):
     print(f"\n{'='*70}")
     print(f"Processing {'PR' if is_pr else 'Issue'} #{issue_number}")
     print(f"{'='*70}")
 
-    issue = get_issue(issue_number)
+    context = context or PRContext(issue_number)
+    issue = context.item
     files = []
     owners = []
 
     if is_pr:
-        files = get_pr_files(issue_number)
+        files = context.files
         print(f"Files changed: {len(files)}")
 
-        try:
-            content = fetch_codeowners()
-            rules = parse_codeowners(content)
-            owners = get_owners_for_files(files, rules)
-            print(f"CODEOWNERS hit: {owners}")
-        except Exception as e:
-            print(f"CODEOWNERS lookup failed: {e}")
+        owners = context.owners
+        print(f"CODEOWNERS hit: {owners}")
 
     prompt = build_agent_prompt(issue, files, owners)
     print("\nSending to Agent…")
 
-    response = call_agent(prompt)
+    response = call_agent(prompt, agent_id="context_retriever")
 
     # Extract clean message: API returns {"response": {"message": "..."}, "steps": [...]}
     if "response" in response and isinstance(response["response"], dict):
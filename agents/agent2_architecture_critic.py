@@ -1,25 +1,13 @@
 import os
-import requests
 from dotenv import load_dotenv
-from tools.diff_parser import fetch_pr_diff, parse_diff_into_chunks, extract_code_patterns
+from agents.agent_client import call_agent
+from tools.diff_parser import extract_code_patterns
+from tools.github_client import github_post
+from pipeline.pr_context import PRContext
 
 load_dotenv()
 
-AGENT_API_URL = os.getenv("ELASTIC_AGENT_URL")
-ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY")
 REPO = os.getenv("GITHUB_REPO")
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-
-HEADERS_GH = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
-
-def get_pr_metadata(pr_number):
-    url  = f"https://api.github.com/repos/{REPO}/pulls/{pr_number}"
-    resp = requests.get(url, headers=HEADERS_GH)
-    resp.raise_for_status()
-    return resp.json()
 
 def build_review_prompt(pr_metadata, file_chunks, prior_context=None):
     pr_title  = pr_metadata.get("title", "")
@@ -76,22 +64,6 @@ Instructions:
 """
     return prompt.strip()
 
-def call_agent(prompt):
-    resp = requests.post(
-        AGENT_API_URL,
-        headers={
-            "Content-Type":  "application/json",
-            "Authorization": f"ApiKey {ELASTIC_API_KEY}",
-            "kbn-xsrf":     "true"
-        },
-        json={"input": prompt, "agent_id": "architecture_critic"},
-        timeout=300
-    )
-    if not resp.ok:
-        print(f"Agent API error {resp.status_code}: {resp.text[:500]}")
-    resp.raise_for_status()
-    return resp.json()
-
 def format_review_as_github_comment(agent_response):
     """
     Wrap the agent's response in a GitHub comment template.
@@ -108,22 +80,23 @@ def format_review_as_github_comment(agent_response):
 
 def post_github_comment(pr_number, comment_body):
     url  = f"https://api.github.com/repos/{REPO}/issues/{pr_number}/comments"
-    resp = requests.post(url, headers=HEADERS_GH, json={"body": comment_body})
+    resp = github_post(url, {"body": comment_body})
     resp.raise_for_status()
     print(f"Posted review comment to PR #{pr_number}")
     return resp.json()
 
-def review_pr(pr_number, post_comment=False, prior_context=None):
+def review_pr(pr_number, post_comment=False, prior_context=None, context=None):
     print(f"\n{'='*60}")
     print(f"Architecture Critic reviewing PR #{pr_number}")
     print('='*60)
 
+    context     = context or PRContext(pr_number)
+
     print("Fetching PR metadata...")
-    pr_metadata = get_pr_metadata(pr_number)
+    pr_metadata = context.item
 
     print("Fetching and parsing diff...")
-    diff        = fetch_pr_diff(pr_number)
-    chunks      = parse_diff_into_chunks(diff)
+    chunks      = context.chunks
     print(f"Found {len(chunks)} changed files")
 
     # Only review files that are likely to have code standards issues
@@ -143,7 +116,7 @@ def review_pr(pr_number, post_comment=False, prior_context=None):
     prompt   = build_review_prompt(pr_metadata, reviewable[:5], prior_context=prior_context)  # cap at 5 files per run
 
     print("Calling Architecture Critic agent...")
-    response = call_agent(prompt)
+    response = call_agent(prompt, agent_id="architecture_critic")
 
     # Extract the clean message from agent response
     # API returns: {"response": {"message": "..."}, "steps": [...], ...}
@@ -1,36 +1,13 @@
 import os
-import requests
 from dotenv import load_dotenv
-from tools.diff_parser import fetch_pr_diff, parse_diff_into_chunks
+from agents.agent_client import call_agent
 from tools.benchmark_queries import get_module_for_file, assess_risk
+from tools.github_client import github_post
+from pipeline.pr_context import PRContext
 
 load_dotenv()
 
-AGENT_API_URL   = os.getenv("ELASTIC_AGENT_URL")
-ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY")
-GITHUB_TOKEN    = os.getenv("GITHUB_TOKEN")
-REPO            = os.getenv("GITHUB_REPO")
-
-HEADERS_GH = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
-
-def call_agent(prompt):
-    resp = requests.post(
-        AGENT_API_URL,
-        headers={
-            "Content-Type":  "application/json",
-            "Authorization": f"ApiKey {ELASTIC_API_KEY}",
-            "kbn-xsrf":     "true"
-        },
-        json={"input": prompt},
-        timeout=300
-    )
-    if not resp.ok:
-        print(f"Agent API error {resp.status_code}: {resp.text[:500]}")
-    resp.raise_for_status()
-    return resp.json()
+REPO = os.getenv("GITHUB_REPO")
 
 def build_impact_prompt(pr_number, file_chunks, risk_assessments, prior_context=None):
     prompt = f"Performance Impact Assessment for PR #{pr_number}\n\n"
@@ -73,13 +50,13 @@ Using the benchmark tools available to you:
 """
     return prompt.strip()
 
-def assess_pr_impact(pr_number, post_comment=False, prior_context=None):
+def assess_pr_impact(pr_number, post_comment=False, prior_context=None, context=None):
     print(f"\n{'='*60}")
     print(f"Impact Quantifier assessing PR #{pr_number}")
     print('='*60)
 
-    diff   = fetch_pr_diff(pr_number)
-    chunks = parse_diff_into_chunks(diff)
+    context = context or PRContext(pr_number)
+    chunks  = context.chunks
 
     # Map files to modules and assess risk
     risk_assessments = []
@@ -100,7 +77,7 @@ def assess_pr_impact(pr_number, post_comment=False, prior_context=None):
         return msg
 
     prompt   = build_impact_prompt(pr_number, chunks, risk_assessments, prior_context=prior_context)
-    response = call_agent(prompt)
+    response = call_agent(prompt, label="impact_quantifier")
     # Extract clean message: API returns {"response": {"message": "..."}, "steps": [...]}
     if "response" in response and isinstance(response["response"], dict):
         result = response["response"].get("message", "")
@@ -126,7 +103,7 @@ def post_github_comment(pr_number, content):
 *Based on 180 days of benchmark history. Data sourced from Elasticsearch benchmark pipeline.*
 """
     url  = f"https://api.github.com/repos/{REPO}/issues/{pr_number}/comments"
-    resp = requests.post(url, headers=HEADERS_GH, json={"body": body})
+    resp = github_post(url, {"body": body})
     resp.raise_for_status()
     print(f"Posted impact comment to PR #{pr_number}")
 
@@ -1,38 +1,13 @@
 import os
-import requests
 from dotenv import load_dotenv
-from pipeline.conflict_detector import (
-    get_all_reviewer_comments,
-    detect_conflicts
-)
+from agents.agent_client import call_agent
+from pipeline.conflict_detector import detect_conflicts
+from pipeline.pr_context import PRContext
+from tools.github_client import github_post
 
 load_dotenv()
 
-AGENT_API_URL   = os.getenv("ELASTIC_AGENT_URL")
-ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY")
-GITHUB_TOKEN    = os.getenv("GITHUB_TOKEN")
-REPO            = os.getenv("GITHUB_REPO")
-
-HEADERS_GH = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
-
-def call_agent(prompt):
-    resp = requests.post(
-        AGENT_API_URL,
-        headers={
-            "Content-Type":  "application/json",
-            "Authorization": f"ApiKey {ELASTIC_API_KEY}",
-            "kbn-xsrf":     "true"
-        },
-        json={"input": prompt},
-        timeout=300
-    )
-    if not resp.ok:
-        print(f"Agent API error {resp.status_code}: {resp.text[:500]}")
-    resp.raise_for_status()
-    return resp.json()
+REPO = os.getenv("GITHUB_REPO")
 
 def build_conflict_prompt(pr_number, conflicts, prior_context=None):
     prompt = f"""
@@ -99,17 +74,17 @@ def format_as_github_comment(pr_number, agent_response, conflicts):
 
 def post_github_comment(pr_number, body):
     url  = f"https://api.github.com/repos/{REPO}/issues/{pr_number}/comments"
-    resp = requests.post(url, headers=HEADERS_GH, json={"body": body})
+    resp = github_post(url, {"body": body})
     resp.raise_for_status()
     print(f"Posted conflict resolution to PR #{pr_number}")
 
-def resolve_pr_conflicts(pr_number, post_comment=False, prior_context=None):
+def resolve_pr_conflicts(pr_number, post_comment=False, prior_context=None, context=None):
     print(f"\n{'='*60}")
     print(f"Conflict Resolver scanning PR #{pr_number}")
     print('='*60)
 
     print("Fetching reviewer comments...")
-    by_reviewer = get_all_reviewer_comments(pr_number)
+    by_reviewer = (context or PRContext(pr_number)).reviewer_comments
     print(f"Reviewers: {list(by_reviewer.keys())}")
 
     print("Detecting conflicts...")
@@ -135,7 +110,7 @@ No reviewer conflicts detected in this PR. Consensus maintained.
 
     prompt   = build_conflict_prompt(pr_number, conflicts, prior_context=prior_context)
     print("\nCalling Conflict Resolver agent...")
-    response = call_agent(prompt)
+    response = call_agent(prompt, label="conflict_resolver")
     # Extract clean message: API returns {"response": {"message": "..."}, "steps": [...]}
     if "response" in response and isinstance(response["response"], dict):
         result = response["response"].get("message", "")
@@ -0,0 +1,125 @@
+import os
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ─────────────────────────────────────────
+# ENV
+# ─────────────────────────────────────────
+AGENT_API_URL   = os.getenv("ELASTIC_AGENT_URL")    # Agent Builder endpoint
+ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY")
+
+REQUEST_TIMEOUT = 300    # seconds; agent runs with several tool steps are slow
+MAX_CONCURRENT  = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))   # calls in flight, all agents
+MAX_PER_AGENT   = int(os.getenv("AGENT_MAX_PER_AGENT", "4"))     # calls in flight, one agent
+
+MAX_RETRIES    = 2       # for 429 / 5xx / connection errors; timeouts are not retried
+RETRY_BACKOFF  = 2       # seconds, doubled per attempt, jittered
+MAX_BACKOFF    = 60
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# ─────────────────────────────────────────
+# SHARED SESSION + LIMITS
+# ─────────────────────────────────────────
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=MAX_CONCURRENT))
+_session.mount("http://", HTTPAdapter(pool_maxsize=MAX_CONCURRENT))
+_session.headers.update({
+    "Content-Type":  "application/json",
+    "Authorization": f"ApiKey {ELASTIC_API_KEY}",
+    "kbn-xsrf":      "true"
+})
+
+_all_agents = threading.BoundedSemaphore(MAX_CONCURRENT)
+_per_agent  = {}
+_lock       = threading.Lock()
+_stats      = {}
+
+def _agent_slot(label):
+    with _lock:
+        if label not in _per_agent:
+            _per_agent[label] = threading.BoundedSemaphore(MAX_PER_AGENT)
+        return _per_agent[label]
+
+def _tool_steps(data):
+    return sum(1 for s in data.get("steps", []) if s.get("type") == "tool_call" or s.get("tool"))
+
+def _record(label, elapsed_ms, sent, received, steps, retries, failed):
+    with _lock:
+        entry = _stats.setdefault(label, {
+            "calls": 0, "errors": 0, "retries": 0, "total_ms": 0, "max_ms": 0,
+            "request_bytes": 0, "response_bytes": 0, "tool_steps": 0
+        })
+        entry["calls"]          += 1
+        entry["errors"]         += failed
+        entry["retries"]        += retries
+        entry["total_ms"]       += elapsed_ms
+        entry["max_ms"]          = max(entry["max_ms"], elapsed_ms)
+        entry["request_bytes"]  += sent
+        entry["response_bytes"] += received
+        entry["tool_steps"]     += steps
+
+def agent_stats():
+    """Per-agent call count, errors, retries, latency, payload sizes and tool steps."""
+    with _lock:
+        return {
+            label: {**entry, "avg_ms": entry["total_ms"] // entry["calls"]}
+            for label, entry in _stats.items()
+        }
+
+# ─────────────────────────────────────────
+# CALL
+# ─────────────────────────────────────────
+def call_agent(prompt, agent_id=None, label=None):
+    """
+    Converse with an Agent Builder agent (the default agent when `agent_id`
+    is None) and return the JSON response. Calls wait for a slot under both
+    the global and the per-agent limit; 429 / 5xx responses and connection
+    errors are retried with backoff. `label` names the caller in agent_stats.
+    """
+    label   = label or agent_id or "default"
+    payload = {"input": prompt}
+    if agent_id:
+        payload["agent_id"] = agent_id
+    sent = len(prompt.encode("utf-8"))
+
+    with _agent_slot(label), _all_agents:
+        started = time.time()
+        retries = 0
+        while True:
+            try:
+                r = _session.post(AGENT_API_URL, json=payload, timeout=REQUEST_TIMEOUT)
+            except requests.ConnectionError:
+                if retries == MAX_RETRIES:
+                    _record(label, int((time.time() - started) * 1000), sent, 0, 0, retries, True)
+                    raise
+                r = None
+            except requests.Timeout:
+                _record(label, int((time.time() - started) * 1000), sent, 0, 0, retries, True)
+                raise
+
+            if r is not None and (r.status_code not in RETRY_STATUSES or retries == MAX_RETRIES):
+                break
+            delay = random.uniform(0, min(MAX_BACKOFF, RETRY_BACKOFF * 2 ** retries))
+            if r is not None and r.headers.get("Retry-After", "").isdigit():
+                delay = max(delay, int(r.headers["Retry-After"]))
+            retries += 1
+            print(f"  [agent {label}] {r.status_code if r is not None else 'connection error'}, retry {retries} in {delay:.0f}s")
+            time.sleep(delay)
+
+    elapsed_ms = int((time.time() - started) * 1000)
+    if not r.ok:
+        print(f"Agent API error {r.status_code}: {r.text[:500]}")
+        _record(label, elapsed_ms, sent, len(r.content), 0, retries, True)
+        r.raise_for_status()
+
+    data  = r.json()
+    steps = _tool_steps(data)
+    _record(label, elapsed_ms, sent, len(r.content), steps, retries, False)
+    print(f"  [agent {label}] {elapsed_ms}ms, {steps} tool step(s), {sent} -> {len(r.content)} bytes")
+    return data
@@ -5,8 +5,12 @@ import asyncio
 import time
 import hmac
 import hashlib
+import contextvars
 import requests
 import threading
+import concurrent.futures
+from functools import partial
+from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, List
@@ -15,7 +19,6 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPExcept
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from elasticsearch import Elasticsearch
 from dotenv import load_dotenv
 
 # Add parent dir to path so we can import the agent modules
@@ -27,38 +30,53 @@ if parent_dir not in sys.path:
 load_dotenv(Path(parent_dir) / ".env")
 
 from pipeline.contributor_checker  import is_first_time_contributor
-from tools.doc_linker              import get_relevant_docs
+from pipeline.pr_context           import PRContext
 from tools.welcome_composer        import compose_welcome_comment, compose_quality_report_comment
 from agents.agent1_context_retriever   import process_issue
 from agents.agent2_architecture_critic import review_pr
 from agents.agent3_impact_quantifier   import assess_pr_impact
 from agents.agent4_conflict_resolver   import resolve_pr_conflicts
-from tools.codeowners    import fetch_codeowners, parse_codeowners, get_owners_for_files
-from indexing.live_indexer import index_issue, index_comment, update_status, delete_document
-from tools.diff_parser import fetch_pr_diff
-
-ELASTIC_ENDPOINT = os.getenv("ELASTIC_ENDPOINT")
-ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY")
-ELASTIC_CLOUD_ID = os.getenv("ELASTIC_CLOUD_ID")
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+from agents.agent_client               import call_agent, agent_stats
+from indexing.live_indexer import index_issue, index_comment, write_queue
+from tools.diff_parser import fetch_pr_file_diffs
+from tools import diff_cache
+from tools.github_client import github_get, github_post, cache_stats, latency_stats
+from tools.github_tokens import pool_state
+from tools.parent_status import with_parent_status_async
+from tools.es_client import lazy_async_client, close_async_es
+
 REPO = os.getenv("GITHUB_REPO")
 WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "").encode()
-AGENT_API_URL = os.getenv("ELASTIC_AGENT_URL")
 
-# Connect to Elasticsearch
-if ELASTIC_CLOUD_ID:
-    es = Elasticsearch(cloud_id=ELASTIC_CLOUD_ID, api_key=ELASTIC_API_KEY, request_timeout=30)
-elif ELASTIC_ENDPOINT:
-    es = Elasticsearch(ELASTIC_ENDPOINT, api_key=ELASTIC_API_KEY, request_timeout=30)
-else:
-    es = None
+# Shared async Elasticsearch client (so handlers never block the event loop),
+# created on first use; falsy when Elasticsearch isn't configured
+es = lazy_async_client()
+
+# The GitHub helpers and agents are synchronous. They run in bounded pools so
+# a burst of webhooks can't exhaust threads or stall the event loop: short
+# GitHub/ES helper calls in io_executor, long agent runs in agent_executor.
+IO_WORKERS    = int(os.getenv("BACKEND_IO_WORKERS", "16"))
+AGENT_WORKERS = int(os.getenv("BACKEND_AGENT_WORKERS", "4"))
+
+io_executor    = concurrent.futures.ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="io")
+agent_executor = concurrent.futures.ThreadPoolExecutor(AGENT_WORKERS, thread_name_prefix="agent")
+
+async def run_io(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, partial(fn, *args, **kwargs))
+
+async def run_agent(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(agent_executor, partial(fn, *args, **kwargs))
 
-HEADERS_GH = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Write out webhook-driven index ops still queued before the process exits
+    await asyncio.to_thread(write_queue.close)
+    await close_async_es()
+    io_executor.shutdown(wait=False)
+    agent_executor.shutdown(wait=False)
 
-app = FastAPI(title="Elastic Contributor Co-pilot Unified API", version="1.1.0")
+app = FastAPI(title="Elastic Contributor Co-pilot Unified API", version="1.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -71,24 +89,69 @@ app.add_middleware(
 RESULTS_DIR = Path(parent_dir) / "results"
 
 # --- WebSocket Hub for Live Events ---
+WS_SEND_QUEUE   = 256   # frames buffered per client; the oldest are dropped beyond this
+WS_SEND_TIMEOUT = 10    # seconds one send may take before the client is disconnected
+WS_HEARTBEAT    = 20    # seconds of silence before a heartbeat frame is sent
+
 class ConnectionManager:
+    """
+    Fans events out to dashboard sockets. Each connection has its own bounded
+    queue drained by its own sender task, so broadcast only enqueues and a
+    slow client can't hold up the others: it loses its oldest frames, and is
+    dropped if a send stalls. Idle connections get a heartbeat, which is how
+    dead ones are noticed and removed.
+    """
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: dict = {}   # websocket -> send queue
+        self.senders: dict = {}              # websocket -> sender task
+        self.stats = {"broadcasts": 0, "sent": 0, "dropped": 0, "disconnected": 0}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        queue = asyncio.Queue(WS_SEND_QUEUE)
+        self.active_connections[websocket] = queue
+        self.senders[websocket] = asyncio.create_task(self._sender(websocket, queue))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        self.active_connections.pop(websocket, None)
+        task = self.senders.pop(websocket, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
+    async def _sender(self, websocket: WebSocket, queue: asyncio.Queue):
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), WS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    message = {"type": "heartbeat", "timestamp": datetime.utcnow().isoformat() + "Z"}
+                await asyncio.wait_for(websocket.send_json(message), WS_SEND_TIMEOUT)
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.stats["disconnected"] += 1
+            self.disconnect(websocket)
             try:
-                await connection.send_json(message)
+                await websocket.close()
             except Exception:
                 pass
 
+    async def broadcast(self, message: dict):
+        self.stats["broadcasts"] += 1
+        for queue in list(self.active_connections.values()):
+            if queue.full():
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait(message)
+
+    def state(self):
+        return {
+            "connections": len(self.active_connections),
+            "queued": sum(q.qsize() for q in self.active_connections.values()),
+            **self.stats
+        }
+
 manager = ConnectionManager()
 
 # --- Models ---
@@ -126,21 +189,7 @@ def verify_signature(payload: bytes, signature: str):
 
 def post_github_comment(pr_number, body):
     url = f"https://api.github.com/repos/{REPO}/issues/{pr_number}/comments"
-    resp = requests.post(url, headers=HEADERS_GH, json={"body": body})
-    resp.raise_for_status()
-    return resp.json()
-
-def get_pr_files(pr_number):
-    url = f"https://api.github.com/repos/{REPO}/pulls/{pr_number}/files"
-    resp = requests.get(url, headers=HEADERS_GH)
-    if resp.status_code == 404:
-        return []
-    resp.raise_for_status()
-    return [f["filename"] for f in resp.json()]
-
-def get_issue_or_pr(number: int):
-    url = f"https://api.github.com/repos/{REPO}/issues/{number}"
-    resp = requests.get(url, headers=HEADERS_GH)
+    resp = github_post(url, {"body": body})
     resp.raise_for_status()
     return resp.json()
 
@@ -177,36 +226,36 @@ async def github_webhook(request: Request, background_tasks: BackgroundTasks):
     if event == "issues":
         issue = data["issue"]
         if data["action"] == "opened":
-            background_tasks.add_task(index_issue, issue)
+            write_queue.enqueue_issue(issue)
             asyncio.ensure_future(triage_and_comment_issue_async(issue["number"], issue.get("title", "")))
         elif data["action"] == "closed":
-            background_tasks.add_task(update_status, issue["number"], "issue", "closed")
+            write_queue.enqueue_status(issue["number"], "issue", "closed")
         elif data["action"] == "deleted":
-            background_tasks.add_task(delete_document, issue["number"], "issue")
+            write_queue.enqueue_delete(issue["number"], "issue")
         elif data["action"] == "labeled":
-            background_tasks.add_task(update_status, issue["number"], "issue", issue["state"])
+            write_queue.enqueue_status(issue["number"], "issue", issue["state"])
 
     elif event == "pull_request":
         pr = data["pull_request"]
         if data["action"] in ["opened", "synchronize"]:
             if data["action"] == "opened":
-                background_tasks.add_task(index_issue, {**pr, "type": "pr"})
+                write_queue.enqueue_issue({**pr, "type": "pr"})
             
             # For opened/synchronize, run full pipeline or specific parts
             background_tasks.add_task(trigger_unified_workflow, pr["number"], pr["user"]["login"], pr["title"])
         
         elif data["action"] == "closed":
             status = "merged" if pr.get("merged_at") else "closed"
-            background_tasks.add_task(update_status, pr["number"], "pr", status)
+            write_queue.enqueue_status(pr["number"], "pr", status)
 
     elif event == "pull_request_review_comment":
         if data["action"] == "created":
-            background_tasks.add_task(index_comment, data["comment"], data["pull_request"]["number"])
-            background_tasks.add_task(resolve_pr_conflicts, data["pull_request"]["number"], post_comment=True)
+            write_queue.enqueue_comment(data["comment"], data["pull_request"]["number"])
+            background_tasks.add_task(run_agent, resolve_pr_conflicts, data["pull_request"]["number"], post_comment=True)
 
     elif event == "pull_request_review":
         if data["action"] == "submitted":
-            background_tasks.add_task(resolve_pr_conflicts, data["pull_request"]["number"], post_comment=True)
+            background_tasks.add_task(run_agent, resolve_pr_conflicts, data["pull_request"]["number"], post_comment=True)
 
     return {"status": "ok"}
 
@@ -243,9 +292,8 @@ async def triage_and_comment_issue_async(issue_number, issue_title=""):
         "timestamp": ts()
     })
     try:
-        loop = asyncio.get_event_loop()
         t0 = time.time()
-        result = await loop.run_in_executor(None, lambda: process_issue(issue_number, is_pr=False))
+        result = await run_agent(process_issue, issue_number, is_pr=False)
         duration_ms = int((time.time() - t0) * 1000)
 
         # Check if duplicate was detected
@@ -273,7 +321,7 @@ async def triage_and_comment_issue_async(issue_number, issue_title=""):
 ---
 *This triage was generated automatically by the Elastic Contributor Co-pilot.*
 """
-            post_github_comment(issue_number, comment_body)
+            await run_io(post_github_comment, issue_number, comment_body)
             print(f"Posted triage comment to Issue #{issue_number}")
             await manager.broadcast({
                 "type": "agent_processing",
@@ -302,52 +350,47 @@ async def trigger_unified_workflow(pr_number, username, pr_title):
     await manager.broadcast({"type": "pipeline_start", "pr_number": pr_number, "username": username, "title": pr_title, "timestamp": ts()})
     
     try:
-        loop = asyncio.get_event_loop()
-
         # 1. Contributor Check
-        is_first, record = is_first_time_contributor(username, pr_number)
+        is_first, record = await run_io(is_first_time_contributor, username, pr_number)
         await manager.broadcast({"type": "agent_processing", "stage": "contributor_check", "number": pr_number, "username": username, "is_first": is_first, "message": f"Contributor check: {'First-time' if is_first else 'Returning'} contributor @{username}", "timestamp": ts()})
 
         # 2. Context Retrieval — Agent 1
         await manager.broadcast({"type": "agent_processing", "stage": "agent_start", "agent": 1, "agent_name": "Context Retriever", "number": pr_number, "message": f"Agent 1 (Context Retriever) analyzing PR #{pr_number}", "timestamp": ts()})
-        files = get_pr_files(pr_number)
-        content = fetch_codeowners()
-        rules = parse_codeowners(content)
-        code_owners = get_owners_for_files(files, rules)
-        relevant_docs = get_relevant_docs(files)
+        ctx = PRContext(pr_number)
         t0 = time.time()
-        await loop.run_in_executor(None, lambda: process_issue(pr_number, is_pr=True))
+        await run_agent(process_issue, pr_number, is_pr=True, context=ctx)
         d1 = int((time.time() - t0) * 1000)
         await manager.broadcast({"type": "agent_processing", "stage": "agent_done", "agent": 1, "agent_name": "Context Retriever", "number": pr_number, "duration_ms": d1, "success": True, "message": f"Agent 1 completed for PR #{pr_number} in {d1}ms", "timestamp": ts()})
 
         # 3. Welcome Bot
         if is_first:
+            code_owners, relevant_docs = await run_io(lambda: (ctx.owners, ctx.docs))
             comment = compose_welcome_comment(
                 username=username, pr_number=pr_number, pr_title=pr_title,
                 similar_issues=[], code_owners=code_owners, relevant_docs=relevant_docs,
                 is_first_time=True
             )
-            post_github_comment(pr_number, comment)
+            await run_io(post_github_comment, pr_number, comment)
             await manager.broadcast({"type": "agent_processing", "stage": "comment_posted", "number": pr_number, "message": f"Welcome comment posted for @{username} on PR #{pr_number}", "timestamp": ts()})
 
         # 4. Architecture Review — Agent 2
         await manager.broadcast({"type": "agent_processing", "stage": "agent_start", "agent": 2, "agent_name": "Architecture Critic", "number": pr_number, "message": f"Agent 2 (Architecture Critic) reviewing PR #{pr_number}", "timestamp": ts()})
         await asyncio.sleep(5)
         t0 = time.time()
-        arch_review = await loop.run_in_executor(None, lambda: review_pr(pr_number, post_comment=False))
+        arch_review = await run_agent(review_pr, pr_number, post_comment=False, context=ctx)
         d2 = int((time.time() - t0) * 1000)
         await manager.broadcast({"type": "agent_processing", "stage": "agent_done", "agent": 2, "agent_name": "Architecture Critic", "number": pr_number, "duration_ms": d2, "success": True, "message": f"Agent 2 completed for PR #{pr_number} in {d2}ms", "timestamp": ts()})
 
         # 5. Impact Assessment — Agent 3
         await manager.broadcast({"type": "agent_processing", "stage": "agent_start", "agent": 3, "agent_name": "Impact Quantifier", "number": pr_number, "message": f"Agent 3 (Impact Quantifier) assessing PR #{pr_number}", "timestamp": ts()})
         t0 = time.time()
-        impact_report = await loop.run_in_executor(None, lambda: assess_pr_impact(pr_number, post_comment=False))
+        impact_report = await run_agent(assess_pr_impact, pr_number, post_comment=False, context=ctx)
         d3 = int((time.time() - t0) * 1000)
         await manager.broadcast({"type": "agent_processing", "stage": "agent_done", "agent": 3, "agent_name": "Impact Quantifier", "number": pr_number, "duration_ms": d3, "success": True, "message": f"Agent 3 completed for PR #{pr_number} in {d3}ms", "timestamp": ts()})
 
         # 6. Post Quality Report
         report = compose_quality_report_comment(pr_number, arch_review, impact_report)
-        post_github_comment(pr_number, report)
+        await run_io(post_github_comment, pr_number, report)
         await manager.broadcast({"type": "agent_processing", "stage": "comment_posted", "number": pr_number, "message": f"Quality report posted to PR #{pr_number}", "timestamp": ts()})
 
     except Exception as e:
@@ -364,7 +407,22 @@ def trigger_elastic_workflow(pr_number, username, pr_title):
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok", "elasticsearch": es is not None, "repo": REPO}
+    return {"status": "ok", "elasticsearch": bool(es), "repo": REPO}
+
+@app.get("/api/ws-stats")
+async def ws_stats():
+    """Live-event fan-out: open dashboard sockets, queued frames, sent/dropped counts."""
+    return manager.state()
+
+@app.get("/api/agent-stats")
+async def agent_call_stats():
+    """Agent Builder calls per agent: latency, retries, payload sizes, tool steps."""
+    return agent_stats()
+
+@app.get("/api/rate-limit")
+async def rate_limit_state():
+    """Per-token GitHub quota, conditional-request and diff cache state, and per-endpoint latency."""
+    return {"pools": pool_state(), "cache": cache_stats(), "diff_cache": diff_cache.stats(), "latency": latency_stats()}
 
 @app.get("/api/stats")
 async def get_stats():
@@ -377,12 +435,10 @@ async def get_stats():
         {"name": "conflict-resolutions", "label": "Resolution Examples", "icon": "⚖️"},
         {"name": "contributor-history", "label": "Contributors Tracked", "icon": "🧑‍💻"},
     ]
-    results = []
-    for idx in indices:
-        try: count = es.count(index=idx["name"])["count"]
-        except: count = 0
-        results.append({**idx, "count": count})
-    return {"indices": results}
+    async def count(idx):
+        try: return {**idx, "count": (await es.count(index=idx["name"]))["count"]}
+        except: return {**idx, "count": 0}
+    return {"indices": list(await asyncio.gather(*(count(idx) for idx in indices)))}
 
 @app.get("/api/impact")
 async def get_impact_metrics():
@@ -396,29 +452,24 @@ async def get_impact_metrics():
         "Conflict Resolver": 1200,     #  20 min to resolve reviewer conflicts
     }
 
-    # Gather actual pipeline run data
-    agent_times = {1: [], 2: [], 3: [], 4: []}
-    total_runs = 0
-    with PIPELINE_RUNS_LOCK:
-        for run_id, run in PIPELINE_RUNS.items():
-            if run.get("status") in ("complete", "error"):
-                total_runs += 1
-                for event in run.get("events", []):
-                    if event.get("type") == "agent_done" and event.get("success"):
-                        agent_times[event["agent"]].append(event["duration_ms"])
+    # Actual pipeline run data: this process's running totals plus history
+    history = await _history_stats() or {"runs": 0, "agent_ms": {}}
+    total_runs = RUN_STATS["runs"] + history["runs"]
 
     # Calculate averages (or use fallback estimates from typical runs)
     avg_agent_ms = {}
     fallback_ms = {1: 8200, 2: 12400, 3: 9800, 4: 6500}
     for aid in [1, 2, 3, 4]:
-        times = agent_times[aid]
-        avg_agent_ms[aid] = int(sum(times) / len(times)) if times else fallback_ms[aid]
+        total_ms, count = RUN_STATS["agent_ms"][aid]
+        hist_ms, hist_count = history["agent_ms"].get(aid, (0, 0))
+        count += hist_count
+        avg_agent_ms[aid] = int((total_ms + hist_ms) / count) if count else fallback_ms[aid]
 
     # ELSER search latency
     search_latency_ms = 0
     try:
         t0 = time.time()
-        es.search(
+        await es.search(
             index="elastic-copilot-chunks",
             body={"size": 1, "query": {"match_all": {}}},
             _source=False
@@ -431,11 +482,11 @@ async def get_impact_metrics():
     doc_count = 0
     chunk_count = 0
     try:
-        doc_count = es.count(index="elastic-copilot")["count"]
+        doc_count = (await es.count(index="elastic-copilot"))["count"]
     except Exception:
         pass
     try:
-        chunk_count = es.count(index="elastic-copilot-chunks")["count"]
+        chunk_count = (await es.count(index="elastic-copilot-chunks"))["count"]
     except Exception:
         pass
 
@@ -485,7 +536,7 @@ async def get_impact_metrics():
 @app.post("/api/search")
 async def search(req: SearchRequest):
     if not req.query.strip(): return {"results": []}
-    result = es.search(
+    result = await es.search(
         index="elastic-copilot-chunks",
         body={
             "size": 5,
@@ -497,10 +548,11 @@ async def search(req: SearchRequest):
                     ]
                 }
             },
-            "_source": ["title", "url", "type", "number", "status", "author"],
+            "_source": ["title", "url", "type", "number", "status", "author", "parent_doc_id"],
         },
     )
-    return {"results": [h["_source"] for h in result["hits"]["hits"]]}
+    hits = await with_parent_status_async(es, result["hits"]["hits"])
+    return {"results": [h["_source"] for h in hits]}
 
 @app.get("/api/recent-runs")
 async def recent_runs():
@@ -516,7 +568,7 @@ async def recent_runs():
 
 @app.post("/internal/check-contributor")
 async def check_contributor(req: ContributorCheckRequest):
-    is_first, record = is_first_time_contributor(req.username, req.pr_number)
+    is_first, record = await run_io(is_first_time_contributor, req.username, req.pr_number)
     return {
         "username": req.username,
         "is_first_time": is_first,
@@ -529,7 +581,7 @@ async def index_pr_endpoint(req: PRContextRequest):
     
     # Check if already indexed
     try:
-        exists = es.exists(index="elastic-copilot", id=f"pr-{pr_number}")
+        exists = await es.exists(index="elastic-copilot", id=f"pr-{pr_number}")
         if exists:
             print(f"PR #{pr_number} already exists in index. Re-indexing to ensure latest content...")
     except Exception:
@@ -539,27 +591,27 @@ async def index_pr_endpoint(req: PRContextRequest):
 
     # Fetch full PR data from GitHub
     pr_url  = f"https://api.github.com/repos/{REPO}/pulls/{pr_number}"
-    pr_resp = requests.get(pr_url, headers=HEADERS_GH)
+    pr_resp = await run_io(github_get, pr_url)
 
     if pr_resp.status_code == 404:
         # Try as issue if not found as PR
         issue_url  = f"https://api.github.com/repos/{REPO}/issues/{pr_number}"
-        pr_resp    = requests.get(issue_url, headers=HEADERS_GH)
+        pr_resp    = await run_io(github_get, issue_url)
 
     pr_resp.raise_for_status()
     pr_data = pr_resp.json()
 
     # Index it immediately using live_indexer
-    index_issue({**pr_data, "type": "pr"})
+    await run_io(index_issue, {**pr_data, "type": "pr"})
 
     # Also fetch and index existing review comments
     comments_url  = f"https://api.github.com/repos/{REPO}/issues/{pr_number}/comments"
-    comments_resp = requests.get(comments_url, headers=HEADERS_GH)
+    comments_resp = await run_io(github_get, comments_url)
 
     if comments_resp.status_code == 200:
         for comment in comments_resp.json():
             try:
-                index_comment(comment, pr_number)
+                await run_io(index_comment, comment, pr_number)
             except Exception as e:
                 print(f"Comment index failed: {e}")
 
@@ -577,51 +629,7 @@ async def index_pr_endpoint(req: PRContextRequest):
 @app.post("/internal/get-pr-context")
 async def get_pr_context_endpoint(req: PRContextRequest):
     try:
-        item = get_issue_or_pr(req.pr_number)
-        is_pr = "pull_request" in item
-        files = get_pr_files(req.pr_number) if is_pr else []
-
-        content = fetch_codeowners()
-        rules = parse_codeowners(content)
-        code_owners = get_owners_for_files(files, rules)
-        relevant_docs = get_relevant_docs(files)
-
-        similar_issues: List[dict] = []
-        if es is not None:
-            query_text = f"{item.get('title', '')}\n{item.get('body') or ''}".strip()
-            if query_text:
-                try:
-                    result = es.search(
-                        index="elastic-copilot",
-                        body={
-                            "size": 5,
-                            "query": {
-                                "bool": {
-                                    "must": [
-                                        {
-                                            "multi_match": {
-                                                "query": query_text,
-                                                "fields": ["title^3", "body"]
-                                            }
-                                        }
-                                    ],
-                                    "must_not": [{"term": {"number": req.pr_number}}]
-                                }
-                            },
-                            "_source": ["title", "url", "type", "number", "status", "author"],
-                        },
-                    )
-                    similar_issues = [h.get("_source", {}) for h in result.get("hits", {}).get("hits", [])]
-                except Exception:
-                    similar_issues = []
-
-        return {
-            "files": files,
-            "code_owners": code_owners,
-            "relevant_docs": relevant_docs,
-            "similar_issues": similar_issues,
-            "item_type": "pr" if is_pr else "issue",
-        }
+        return await run_io(PRContext(req.pr_number).to_dict)
     except Exception as e:
         return JSONResponse({"status": "error", "error": str(e)}, status_code=500)
 
@@ -637,7 +645,7 @@ async def post_welcome_endpoint(req: WelcomeRequest):
         is_first_time=True
     )
     try:
-        post_github_comment(req.pr_number, comment)
+        await run_io(post_github_comment, req.pr_number, comment)
         return {"status": "ok"}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
@@ -645,10 +653,11 @@ async def post_welcome_endpoint(req: WelcomeRequest):
 @app.post("/internal/run-quality-report")
 async def run_quality_report_endpoint(req: PRContextRequest):
     try:
-        arch_review = review_pr(req.pr_number, post_comment=False)
-        impact_report = assess_pr_impact(req.pr_number, post_comment=False)
+        ctx = PRContext(req.pr_number)
+        arch_review = await run_agent(review_pr, req.pr_number, post_comment=False, context=ctx)
+        impact_report = await run_agent(assess_pr_impact, req.pr_number, post_comment=False, context=ctx)
         report = compose_quality_report_comment(req.pr_number, arch_review, impact_report)
-        post_github_comment(req.pr_number, report)
+        await run_io(post_github_comment, req.pr_number, report)
         return {"status": "ok"}
     except Exception as e:
         return JSONResponse({"status": "error", "detail": str(e)}, status_code=500)
@@ -660,14 +669,14 @@ async def run_agent1_endpoint(request: Request):
     is_pr = data.get("is_pr", False)
     post_comment = data.get("post_comment", True)
     try:
-        result = process_issue(number, is_pr=is_pr)
+        result = await run_agent(process_issue, number, is_pr=is_pr)
         comment_id = None
         if post_comment:
             comment_body = f"""## 🤖 Elastic Contributor Co-pilot - Context Report
 
 {result}
 """
-            posted = post_github_comment(number, comment_body)
+            posted = await run_io(post_github_comment, number, comment_body)
             comment_id = posted.get("id")
         return {"status": "ok", "result": str(result)[:500], "comment_id": comment_id}
     except Exception as e:
@@ -679,7 +688,7 @@ async def run_agent4_endpoint(request: Request):
     pr_number = data["pr_number"]
     post_comment = data.get("post_comment", False)
     try:
-        result = resolve_pr_conflicts(pr_number, post_comment=post_comment)
+        result = await run_agent(resolve_pr_conflicts, pr_number, post_comment=post_comment)
         return {"status": "ok", "result": str(result)[:500]}
     except Exception as e:
         return JSONResponse({"status": "error", "error": str(e)}, status_code=500)
@@ -690,7 +699,7 @@ async def detect_conflicts_endpoint(request: Request):
     pr_number = data["pr_number"]
     try:
         from conflict_detector import get_all_reviewer_comments, detect_conflicts
-        by_reviewer = get_all_reviewer_comments(pr_number)
+        by_reviewer = await run_io(get_all_reviewer_comments, pr_number)
         conflicts = detect_conflicts(by_reviewer)
         return {"status": "ok", "conflicts": conflicts, "count": len(conflicts)}
     except Exception as e:
@@ -700,29 +709,39 @@ async def detect_conflicts_endpoint(request: Request):
 async def run_sync_endpoint():
     try:
         from incremental_sync import run_incremental_sync
-        issues, comments = run_incremental_sync()
+        issues, comments = await run_io(run_incremental_sync)
         return {"status": "ok", "issues": issues, "comments": comments}
     except Exception as e:
         return JSONResponse({"status": "error", "error": str(e)}, status_code=500)
 
-import concurrent.futures
 from uuid import uuid4
+from collections import OrderedDict
 
 # --- Pipeline run session store for reconnect/replay ---
-PIPELINE_RUNS = {}
+# Active runs and recently finished ones stay in memory (most recently used
+# last) so dashboards can reconnect and replay them. Finished runs are
+# persisted to Elasticsearch and evicted once more than MAX_CACHED_RUNS are
+# held or they have been idle for RUN_CACHE_TTL; a reconnect to an evicted
+# run reloads it from there.
+PIPELINE_RUNS = OrderedDict()
 PIPELINE_RUNS_LOCK = threading.Lock()
-PIPELINE_STDOUT_LOCK = threading.Lock()
 MAX_PIPELINE_EVENTS = 5000
+MAX_CACHED_RUNS = int(os.getenv("PIPELINE_MAX_CACHED_RUNS", "100"))
+RUN_CACHE_TTL   = int(os.getenv("PIPELINE_RUN_TTL", "3600"))   # seconds
+PROCESS_STARTED = datetime.utcnow().isoformat()
 
 PIPELINE_RUNS_INDEX = "elastic-copilot-pipeline-runs"
 
-def _ensure_pipeline_runs_index():
+_runs_index_ready = False
+
+async def _ensure_pipeline_runs_index():
     """Create the pipeline-runs index if it doesn't exist."""
-    if not es:
+    global _runs_index_ready
+    if not es or _runs_index_ready:
         return
     try:
-        if not es.indices.exists(index=PIPELINE_RUNS_INDEX):
-            es.indices.create(index=PIPELINE_RUNS_INDEX, body={
+        if not await es.indices.exists(index=PIPELINE_RUNS_INDEX):
+            await es.indices.create(index=PIPELINE_RUNS_INDEX, body={
                 "mappings": {
                     "properties": {
                         "run_id": {"type": "keyword"},
@@ -746,14 +765,16 @@ def _ensure_pipeline_runs_index():
                 }
             })
             print(f"Created index: {PIPELINE_RUNS_INDEX}")
+        _runs_index_ready = True
     except Exception as e:
         print(f"Warning: Could not create pipeline-runs index: {e}")
 
-def _save_run_to_es(run_id: str, run: dict):
-    """Persist a completed pipeline run to Elasticsearch."""
+async def _save_run_to_es(run_id: str, run: dict):
+    """Persist a finished pipeline run to Elasticsearch."""
     if not es:
         return
     try:
+        await _ensure_pipeline_runs_index()
         doc = {
             "run_id": run_id,
             "mode": run.get("mode", "pr"),
@@ -773,59 +794,199 @@ def _save_run_to_es(run_id: str, run: dict):
                 for s in run.get("steps", [])
             ]
         }
-        es.index(index=PIPELINE_RUNS_INDEX, id=run_id, document=doc)
+        await es.index(index=PIPELINE_RUNS_INDEX, id=run_id, document=doc)
         print(f"Saved pipeline run {run_id} to Elasticsearch")
     except Exception as e:
         print(f"Warning: Could not save pipeline run to ES: {e}")
 
-def _load_runs_from_es():
-    """Load historical pipeline runs from Elasticsearch on startup."""
-    if not es:
-        return 0
+def _run_from_doc(doc: dict) -> dict:
+    """Rebuild a replayable run from its pipeline-runs document."""
+    return {
+        "id": doc["run_id"],
+        "mode": doc.get("mode", "pr"),
+        "number": doc.get("number", 0),
+        "status": doc.get("status", "complete"),
+        "started": True,
+        "events": [
+            {
+                "type": "agent_done",
+                "agent": s["agent"],
+                "name": s.get("name", ""),
+                "success": s.get("success", True),
+                "duration_ms": s.get("duration_ms", 0)
+            }
+            for s in doc.get("steps", [])
+        ],
+        "steps": doc.get("steps", []),
+        "total_time_ms": doc.get("total_time_ms", 0),
+        "success": doc.get("success", False),
+        "created_at": doc.get("created_at", ""),
+        "updated_at": doc.get("completed_at", ""),
+    }
+
+def _cache_run(run_id: str, run: dict):
+    """Insert or refresh a run in the memory tier and evict what no longer fits."""
+    now = time.time()
+    with PIPELINE_RUNS_LOCK:
+        run["accessed"] = now
+        PIPELINE_RUNS[run_id] = run
+        PIPELINE_RUNS.move_to_end(run_id)
+        excess = len(PIPELINE_RUNS) - MAX_CACHED_RUNS
+        for rid, cached in list(PIPELINE_RUNS.items()):
+            if cached.get("status") not in ("complete", "error"):
+                continue   # never evict a run that is still streaming
+            if excess > 0 or now - cached.get("accessed", 0) > RUN_CACHE_TTL:
+                del PIPELINE_RUNS[rid]
+                excess -= 1
+
+async def _get_run(run_id: str):
+    """A run from memory, or from Elasticsearch if it has been evicted."""
+    with PIPELINE_RUNS_LOCK:
+        run = PIPELINE_RUNS.get(run_id)
+    if run is None and es:
+        try:
+            resp = await es.get(index=PIPELINE_RUNS_INDEX, id=run_id)
+            run  = _run_from_doc(resp["_source"])
+        except Exception:
+            return None
+    if run is not None:
+        _cache_run(run_id, run)
+    return run
+
+# --- Impact metrics ---
+# Kept as running totals: runs finished by this process are added as they
+# complete, and runs from before it started are aggregated from
+# Elasticsearch once, the first time /api/impact needs them.
+RUN_STATS     = {"runs": 0, "agent_ms": {aid: [0, 0] for aid in (1, 2, 3, 4)}}
+HISTORY_STATS = None
+
+def _record_run_stats(steps: list):
+    RUN_STATS["runs"] += 1
+    for step in steps:
+        if step.get("success") and step.get("agent") in RUN_STATS["agent_ms"]:
+            RUN_STATS["agent_ms"][step["agent"]][0] += step.get("duration_ms", 0)
+            RUN_STATS["agent_ms"][step["agent"]][1] += 1
+
+async def _history_stats():
+    """Run count and per-agent [total_ms, count] for runs before this process started."""
+    global HISTORY_STATS
+    if HISTORY_STATS is not None or not es:
+        return HISTORY_STATS
     try:
-        _ensure_pipeline_runs_index()
-        result = es.search(index=PIPELINE_RUNS_INDEX, body={
-            "size": 100,
-            "sort": [{"completed_at": {"order": "desc"}}],
-            "query": {"match_all": {}}
+        resp = await es.search(index=PIPELINE_RUNS_INDEX, body={
+            "size": 0,
+            "track_total_hits": True,
+            "query": {"range": {"completed_at": {"lt": PROCESS_STARTED}}},
+            "aggs": {"steps": {"nested": {"path": "steps"}, "aggs": {
+                "ok": {"filter": {"term": {"steps.success": True}}, "aggs": {
+                    "agents": {"terms": {"field": "steps.agent", "size": 10}, "aggs": {
+                        "ms": {"sum": {"field": "steps.duration_ms"}}
+                    }}
+                }}
+            }}}
         })
-        count = 0
-        for hit in result["hits"]["hits"]:
-            doc = hit["_source"]
-            rid = doc["run_id"]
-            if rid not in PIPELINE_RUNS:
-                PIPELINE_RUNS[rid] = {
-                    "id": rid,
-                    "mode": doc.get("mode", "pr"),
-                    "number": doc.get("number", 0),
-                    "status": doc.get("status", "complete"),
-                    "started": True,
-                    "events": [
-                        {
-                            "type": "agent_done",
-                            "agent": s["agent"],
-                            "name": s.get("name", ""),
-                            "success": s.get("success", True),
-                            "duration_ms": s.get("duration_ms", 0)
-                        }
-                        for s in doc.get("steps", [])
-                    ],
-                    "steps": doc.get("steps", []),
-                    "total_time_ms": doc.get("total_time_ms", 0),
-                    "success": doc.get("success", False),
-                    "created_at": doc.get("created_at", ""),
-                    "updated_at": doc.get("completed_at", ""),
-                }
-                count += 1
-        return count
     except Exception as e:
-        print(f"Warning: Could not load pipeline runs from ES: {e}")
-        return 0
+        print(f"Warning: Could not aggregate pipeline run history: {e}")
+        return None
+    agent_ms = {aid: [0, 0] for aid in (1, 2, 3, 4)}
+    for bucket in resp["aggregations"]["steps"]["ok"]["agents"]["buckets"]:
+        if bucket["key"] in agent_ms:
+            agent_ms[bucket["key"]] = [int(bucket["ms"]["value"]), bucket["doc_count"]]
+    HISTORY_STATS = {"runs": resp["hits"]["total"]["value"], "agent_ms": agent_ms}
+    return HISTORY_STATS
+
+# --- Per-run stdout capture ---
+# Agents report progress with print(). Instead of swapping sys.stdout for the
+# duration of a run (which serialised runs process-wide), stdout is wrapped
+# once and each write is routed to the sink of whichever run the writing
+# task/thread belongs to, so concurrent runs never interleave their logs.
+_run_log_sink = contextvars.ContextVar("run_log_sink", default=None)
+
+class RunStdout:
+    def __init__(self, terminal):
+        self.terminal = terminal
+    def write(self, s):
+        self.terminal.write(s)
+        if "\n" in s:
+            self.terminal.flush()
+        sink = _run_log_sink.get()
+        if sink:
+            sink(s)
+        return len(s)
+    def flush(self):
+        self.terminal.flush()
+    def __getattr__(self, name):
+        return getattr(self.terminal, name)
+
+def _install_run_stdout():
+    if not isinstance(sys.stdout, RunStdout):
+        sys.stdout = RunStdout(sys.stdout)
+
+# A run's output reaches the dashboard as "logs" events carrying a batch of
+# lines rather than one frame per print() fragment.
+LOG_FLUSH_INTERVAL = 0.1   # seconds lines may wait to be batched
+LOG_FLUSH_LINES    = 200   # lines per event; reaching it flushes straight away
+
+class RunLogBuffer:
+    """Line-buffers one run's stdout from agent threads and appends it in batches."""
+    def __init__(self, run_id: str, loop):
+        self.run_id     = run_id
+        self.loop       = loop
+        self._lock      = threading.Lock()
+        self._partial   = ""
+        self._lines     = []
+        self._scheduled = False
+        self._urgent    = False
+
+    def write(self, s: str):
+        """Called from any thread."""
+        with self._lock:
+            *lines, self._partial = (self._partial + s).split("\n")
+            self._lines.extend(line.strip() for line in lines if line.strip())
+            if not self._lines:
+                return
+            if len(self._lines) >= LOG_FLUSH_LINES and not self._urgent:
+                self._urgent = True
+                delay = 0
+            elif not self._scheduled:
+                self._scheduled = True
+                delay = LOG_FLUSH_INTERVAL
+            else:
+                return
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, self.flush)
+
+    def flush(self, final: bool = False):
+        """Append pending lines as events. Runs on the event loop."""
+        with self._lock:
+            lines, self._lines = self._lines, []
+            if final and self._partial.strip():
+                lines.append(self._partial.strip())
+                self._partial = ""
+            self._scheduled = self._urgent = False
+        for i in range(0, len(lines), LOG_FLUSH_LINES):
+            _append_run_event(self.run_id, {"type": "logs", "messages": lines[i:i + LOG_FLUSH_LINES], "run_id": self.run_id})
+
+def _call_in_run(sink, fn, *args, **kwargs):
+    """Run fn in an executor thread with its output going to `sink`."""
+    token = _run_log_sink.set(sink)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _run_log_sink.reset(token)
 
-# Load historical runs on startup
-_loaded = _load_runs_from_es()
-if _loaded:
-    print(f"Loaded {_loaded} historical pipeline runs from Elasticsearch")
+# --- Run change notification ---
+# Subscribers wait on the run's current Event; every change sets it and drops
+# it, so the next wait gets a fresh one and idle sockets sleep until there is
+# news. Only touched from the event loop.
+PIPELINE_RUN_SIGNALS = {}
+
+def _run_changed(run_id: str) -> asyncio.Event:
+    return PIPELINE_RUN_SIGNALS.setdefault(run_id, asyncio.Event())
+
+def _notify_run(run_id: str):
+    signal = PIPELINE_RUN_SIGNALS.pop(run_id, None)
+    if signal:
+        signal.set()
 
 def _append_run_event(run_id: str, payload: dict):
     with PIPELINE_RUNS_LOCK:
@@ -833,9 +994,12 @@ def _append_run_event(run_id: str, payload: dict):
         if not run:
             return
         run["events"].append(payload)
-        if len(run["events"]) > MAX_PIPELINE_EVENTS:
-            run["events"] = run["events"][-MAX_PIPELINE_EVENTS:]
+        excess = len(run["events"]) - MAX_PIPELINE_EVENTS
+        if excess > 0:
+            run["events"] = run["events"][excess:]
+            run["events_dropped"] = run.get("events_dropped", 0) + excess
         run["updated_at"] = datetime.utcnow().isoformat()
+    _notify_run(run_id)
 
 async def _execute_pipeline_run(run_id: str):
     with PIPELINE_RUNS_LOCK:
@@ -880,108 +1044,78 @@ async def _execute_pipeline_run(run_id: str):
         skip_ids = [4]
 
     agent_outputs = {}
+    ctx = PRContext(number)
 
     _append_run_event(run_id, {"type": "start", "run_id": run_id, "mode": mode, "number": number})
 
-    log_queue = asyncio.Queue()
-
-    class RunLogger:
-        def __init__(self, terminal, queue):
-            self.terminal = terminal
-            self.queue = queue
-        def write(self, s):
-            self.terminal.write(s)
-            self.terminal.flush()
-            msg = s.strip()
-            if msg:
-                self.queue.put_nowait(msg)
-        def flush(self):
-            self.terminal.flush()
+    log_buffer = RunLogBuffer(run_id, asyncio.get_running_loop())
+    sink = log_buffer.write
 
-    async def log_reader():
-        try:
-            while True:
-                msg = await log_queue.get()
-                _append_run_event(run_id, {"type": "log", "message": msg, "run_id": run_id})
-                log_queue.task_done()
-        except asyncio.CancelledError:
-            pass
-
-    reader_task = asyncio.create_task(log_reader())
-
-    old_stdout = sys.stdout
+    _install_run_stdout()
     try:
-        with PIPELINE_STDOUT_LOCK:
-            sys.stdout = RunLogger(sys.__stdout__, log_queue)
+        for aid in agent_ids:
+            name, reasoning, tools_list = agent_meta[aid]
+            _append_run_event(run_id, {
+                "type": "agent_start", "agent": aid, "name": name, "run_id": run_id,
+                "reasoning": reasoning, "tools": tools_list
+            })
+            t = time.time()
             try:
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    for aid in agent_ids:
-                        name, reasoning, tools_list = agent_meta[aid]
-                        _append_run_event(run_id, {
-                            "type": "agent_start", "agent": aid, "name": name, "run_id": run_id,
-                            "reasoning": reasoning, "tools": tools_list
-                        })
-                        t = time.time()
-                        try:
-                            # Build the call with context chaining
-                            if aid == 1:
-                                future = executor.submit(process_issue, number, mode != "issue")
-                            elif aid == 2:
-                                future = executor.submit(review_pr, number, False, agent_outputs.get(1))
-                            elif aid == 3:
-                                prior3 = ""
-                                if agent_outputs.get(1):
-                                    prior3 += f"## Agent 1 (Context Retriever) Findings:\n{agent_outputs[1][:800]}\n\n"
-                                if agent_outputs.get(2):
-                                    prior3 += f"## Agent 2 (Architecture Critic) Findings:\n{agent_outputs[2][:800]}\n"
-                                future = executor.submit(assess_pr_impact, number, False, prior3 or None)
-                            elif aid == 4:
-                                future = executor.submit(resolve_pr_conflicts, number, False, agent_outputs.get(1))
-
-                            while not future.done():
-                                await asyncio.sleep(0.1)
-
-                            res = future.result()
-                            dur = int((time.time() - t) * 1000)
-
-                            if isinstance(res, str):
-                                agent_outputs[aid] = res
-                                if aid == 2:
-                                    architecture_report = res
-                                elif aid == 3:
-                                    impact_report = res
-                                elif aid == 4:
-                                    conflict_report = res
-
-                            summary = res[:1000] if isinstance(res, str) else "Step completed"
-                            step = {"agent": aid, "name": name, "success": True, "duration_ms": dur, "summary": summary}
-                            steps.append(step)
-                            _append_run_event(run_id, {
-                                "type": "agent_done", "agent": aid, "name": name, "success": True,
-                                "duration_ms": dur, "result": summary, "run_id": run_id,
-                                "reasoning": reasoning, "tools_used": tools_list
-                            })
-                        except Exception as e:
-                            dur = int((time.time() - t) * 1000)
-                            step = {"agent": aid, "name": name, "success": False, "duration_ms": dur, "error": str(e)}
-                            steps.append(step)
-                            _append_run_event(run_id, {"type": "agent_error", "agent": aid, "name": name, "error": str(e), "duration_ms": dur, "run_id": run_id})
-
-                    # Emit skip events for agents not applicable in this mode
-                    for sid in skip_ids:
-                        sname, sreasoning, stools = agent_meta[sid]
-                        skip_reason = f"Skipped — not applicable for {mode} mode"
-                        _append_run_event(run_id, {
-                            "type": "agent_done", "agent": sid, "name": sname, "success": True,
-                            "duration_ms": 0, "result": skip_reason,
-                            "run_id": run_id, "skipped": True,
-                            "reasoning": sreasoning, "tools_used": stools
-                        })
-                        steps.append({"agent": sid, "name": sname, "success": True, "duration_ms": 0, "summary": skip_reason, "skipped": True})
-            finally:
-                sys.stdout = old_stdout
+                # Build the call with context chaining
+                if aid == 1:
+                    future = agent_executor.submit(_call_in_run, sink, process_issue, number, mode != "issue", context=ctx)
+                elif aid == 2:
+                    future = agent_executor.submit(_call_in_run, sink, review_pr, number, False, agent_outputs.get(1), context=ctx)
+                elif aid == 3:
+                    prior3 = ""
+                    if agent_outputs.get(1):
+                        prior3 += f"## Agent 1 (Context Retriever) Findings:\n{agent_outputs[1][:800]}\n\n"
+                    if agent_outputs.get(2):
+                        prior3 += f"## Agent 2 (Architecture Critic) Findings:\n{agent_outputs[2][:800]}\n"
+                    future = agent_executor.submit(_call_in_run, sink, assess_pr_impact, number, False, prior3 or None, context=ctx)
+                elif aid == 4:
+                    future = agent_executor.submit(_call_in_run, sink, resolve_pr_conflicts, number, False, agent_outputs.get(1), context=ctx)
+
+                res = await asyncio.wrap_future(future)
+                dur = int((time.time() - t) * 1000)
+
+                if isinstance(res, str):
+                    agent_outputs[aid] = res
+                    if aid == 2:
+                        architecture_report = res
+                    elif aid == 3:
+                        impact_report = res
+                    elif aid == 4:
+                        conflict_report = res
+
+                summary = res[:1000] if isinstance(res, str) else "Step completed"
+                step = {"agent": aid, "name": name, "success": True, "duration_ms": dur, "summary": summary}
+                steps.append(step)
+                _append_run_event(run_id, {
+                    "type": "agent_done", "agent": aid, "name": name, "success": True,
+                    "duration_ms": dur, "result": summary, "run_id": run_id,
+                    "reasoning": reasoning, "tools_used": tools_list
+                })
+            except Exception as e:
+                dur = int((time.time() - t) * 1000)
+                step = {"agent": aid, "name": name, "success": False, "duration_ms": dur, "error": str(e)}
+                steps.append(step)
+                _append_run_event(run_id, {"type": "agent_error", "agent": aid, "name": name, "error": str(e), "duration_ms": dur, "run_id": run_id})
+
+        # Emit skip events for agents not applicable in this mode
+        for sid in skip_ids:
+            sname, sreasoning, stools = agent_meta[sid]
+            skip_reason = f"Skipped — not applicable for {mode} mode"
+            _append_run_event(run_id, {
+                "type": "agent_done", "agent": sid, "name": sname, "success": True,
+                "duration_ms": 0, "result": skip_reason,
+                "run_id": run_id, "skipped": True,
+                "reasoning": sreasoning, "tools_used": stools
+            })
+            steps.append({"agent": sid, "name": sname, "success": True, "duration_ms": 0, "summary": skip_reason, "skipped": True})
     except Exception as e:
         run_failed = True
+        log_buffer.flush(final=True)
         with PIPELINE_RUNS_LOCK:
             run = PIPELINE_RUNS.get(run_id)
             if run:
@@ -989,18 +1123,20 @@ async def _execute_pipeline_run(run_id: str):
                 run["error"] = str(e)
         _append_run_event(run_id, {"type": "log", "message": f"Pipeline failed: {e}", "run_id": run_id})
     finally:
-        await asyncio.sleep(1.0)
-        reader_task.cancel()
-        try:
-            await reader_task
-        except asyncio.CancelledError:
-            pass
+        # Every agent write reached the buffer before its future completed
+        log_buffer.flush(final=True)
 
     if run_failed:
         with PIPELINE_RUNS_LOCK:
             run = PIPELINE_RUNS.get(run_id)
             if run:
+                run["steps"] = steps
                 run["updated_at"] = datetime.utcnow().isoformat()
+        _notify_run(run_id)
+        _record_run_stats(steps)
+        if run:
+            await _save_run_to_es(run_id, run)
+            _cache_run(run_id, run)
         return
 
     if mode == "pr":
@@ -1050,8 +1186,13 @@ async def _execute_pipeline_run(run_id: str):
             run["success"] = success
             run["status"] = "complete"
             run["updated_at"] = datetime.utcnow().isoformat()
-            # Persist to Elasticsearch
-            _save_run_to_es(run_id, run)
+    _notify_run(run_id)
+    _record_run_stats(steps)
+
+    # Persist to Elasticsearch, then let the memory tier evict it when due
+    if run:
+        await _save_run_to_es(run_id, run)
+        _cache_run(run_id, run)
 
 
 # --- WebSocket: Live Pipeline Execution (supports reconnect by run_id) ---
@@ -1064,32 +1205,31 @@ async def pipeline_ws(websocket: WebSocket):
         number = data.get("number", 95103)
         requested_run_id = data.get("run_id")
 
-        with PIPELINE_RUNS_LOCK:
-            existing = PIPELINE_RUNS.get(requested_run_id) if requested_run_id else None
-            if existing:
-                run = existing
-                run_id = requested_run_id
-            elif requested_run_id:
-                # Client tried to reconnect to a run that no longer exists (e.g. backend restarted)
-                await websocket.send_json({"type": "run_id", "run_id": requested_run_id, "status": "not_found"})
-                return
-            else:
-                run_id = str(uuid4())
-                run = {
-                    "id": run_id,
-                    "mode": mode,
-                    "number": number,
-                    "status": "pending",
-                    "started": False,
-                    "events": [],
-                    "steps": [],
-                    "final_output": "",
-                    "total_time_ms": 0,
-                    "success": None,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "updated_at": datetime.utcnow().isoformat(),
-                }
-                PIPELINE_RUNS[run_id] = run
+        existing = await _get_run(requested_run_id) if requested_run_id else None
+        if existing:
+            run = existing
+            run_id = requested_run_id
+        elif requested_run_id:
+            # Client tried to reconnect to a run that no longer exists (e.g. never persisted)
+            await websocket.send_json({"type": "run_id", "run_id": requested_run_id, "status": "not_found"})
+            return
+        else:
+            run_id = str(uuid4())
+            run = {
+                "id": run_id,
+                "mode": mode,
+                "number": number,
+                "status": "pending",
+                "started": False,
+                "events": [],
+                "steps": [],
+                "final_output": "",
+                "total_time_ms": 0,
+                "success": None,
+                "created_at": datetime.utcnow().isoformat(),
+                "updated_at": datetime.utcnow().isoformat(),
+            }
+            _cache_run(run_id, run)
 
         # Let client know which run it is attached to
         await websocket.send_json({"type": "run_id", "run_id": run_id, "status": run.get("status"), "mode": run.get("mode"), "number": run.get("number")})
@@ -1098,30 +1238,27 @@ async def pipeline_ws(websocket: WebSocket):
         if not run.get("started"):
             asyncio.create_task(_execute_pipeline_run(run_id))
 
+        # cursor counts every event ever appended, including ones trimmed
+        # from the front of a long run's buffer. The run dict is held
+        # directly, so the store evicting it doesn't cut the stream short.
         cursor = 0
         while True:
             with PIPELINE_RUNS_LOCK:
-                current = PIPELINE_RUNS.get(run_id)
-                if not current:
-                    break
-                pending = current["events"][cursor:]
-                status = current.get("status")
+                dropped = run.get("events_dropped", 0)
+                pending = run["events"][max(cursor - dropped, 0):]
+                cursor  = max(cursor, dropped) + len(pending)
+                status  = run.get("status")
+            done = status in ("complete", "error")
+            # Taken in the same loop step as the snapshot, so no change is missed
+            changed = None if done else _run_changed(run_id)
 
             for event in pending:
                 await websocket.send_json(event)
-                cursor += 1
-
-            if status in ("complete", "error"):
-                # Flush any final events before closing
-                with PIPELINE_RUNS_LOCK:
-                    current = PIPELINE_RUNS.get(run_id)
-                    if current and cursor < len(current["events"]):
-                        for event in current["events"][cursor:]:
-                            await websocket.send_json(event)
-                            cursor += 1
+
+            if done:
                 break
 
-            await asyncio.sleep(0.1)
+            await changed.wait()
     except (WebSocketDisconnect, asyncio.CancelledError):
         pass
     except Exception as e:
@@ -1165,18 +1302,7 @@ async def chat_endpoint(req: ChatRequest):
 - Be concise and precise."""
 
     try:
-        resp = requests.post(
-            AGENT_API_URL,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"ApiKey {ELASTIC_API_KEY}",
-                "kbn-xsrf": "true"
-            },
-            json={"input": prompt, "agent_id": "context_retriever"},
-            timeout=300
-        )
-        resp.raise_for_status()
-        data = resp.json()
+        data = await run_io(call_agent, prompt, agent_id="context_retriever", label="chat")
 
         # Extract clean message
         if "response" in data and isinstance(data["response"], dict):
@@ -1207,52 +1333,8 @@ async def chat_endpoint(req: ChatRequest):
 async def get_pr_diff(number: int):
     """Fetch and parse the diff for a PR into per-file chunks."""
     try:
-        # Fetch raw diff from GitHub
-        diff_url = f"https://api.github.com/repos/{REPO}/pulls/{number}"
-        diff_headers = {
-            "Authorization": f"token {GITHUB_TOKEN}",
-            "Accept": "application/vnd.github.v3.diff"
-        }
-        resp = requests.get(diff_url, headers=diff_headers, timeout=30)
-        if resp.status_code == 404:
-            return JSONResponse(status_code=404, content={"error": f"PR #{number} not found"})
-        resp.raise_for_status()
-        raw_diff = resp.text
-
-        # Parse into per-file chunks with both added and removed lines
-        files = []
-        current_file = None
-        added_lines = []
-        removed_lines = []
-        all_lines = []  # unified view
-
-        for line in raw_diff.splitlines():
-            if line.startswith("diff --git"):
-                if current_file:
-                    files.append({
-                        "file": current_file,
-                        "additions": len(added_lines),
-                        "deletions": len(removed_lines),
-                        "diff": "\n".join(all_lines)
-                    })
-                current_file = line.split(" b/")[-1]
-                added_lines = []
-                removed_lines = []
-                all_lines = []
-            elif current_file:
-                all_lines.append(line)
-                if line.startswith("+") and not line.startswith("+++"):
-                    added_lines.append(line)
-                elif line.startswith("-") and not line.startswith("---"):
-                    removed_lines.append(line)
-
-        if current_file:
-            files.append({
-                "file": current_file,
-                "additions": len(added_lines),
-                "deletions": len(removed_lines),
-                "diff": "\n".join(all_lines)
-            })
+        # Raw diff and its per-file parse both come from the SHA-keyed diff cache
+        files = await run_io(fetch_pr_file_diffs, number)
 
         return {
             "pr_number": number,
@@ -1260,6 +1342,8 @@ async def get_pr_diff(number: int):
             "files": files
         }
     except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return JSONResponse(status_code=404, content={"error": f"PR #{number} not found"})
         return JSONResponse(status_code=502, content={"error": f"GitHub API error: {str(e)}"})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -1270,7 +1354,7 @@ async def get_file_content(path: str, ref: str = "main"):
     """Fetch raw file content from GitHub for code viewing."""
     try:
         url = f"https://api.github.com/repos/{REPO}/contents/{path}?ref={ref}"
-        resp = requests.get(url, headers=HEADERS_GH, timeout=15)
+        resp = await run_io(github_get, url, timeout=15)
         if resp.status_code == 404:
             return JSONResponse(status_code=404, content={"error": f"File not found: {path}"})
         resp.raise_for_status()
@@ -1310,6 +1394,8 @@ async def events_ws(websocket: WebSocket):
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 if __name__ == "__main__":
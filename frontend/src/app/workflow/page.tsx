@@ -82,6 +82,9 @@ export default function WorkflowPage() {
                 case "log":
                     setLogs((prev) => [...prev, data.message]);
                     break;
+                case "logs":
+                    setLogs((prev) => [...prev, ...data.messages]);
+                    break;
                 case "agent_start":
                     setCurrentStep(data.agent);
                     break;
@@ -140,6 +140,7 @@ export default function LiveActivityFeed() {
             ws.onmessage = (msg) => {
                 try {
                     const data = JSON.parse(msg.data);
+                    if (data.type === "heartbeat") return;
                     const event: LiveEvent = {
                         ...data,
                         id: `${Date.now()}-${Math.random().toString(36).slice(2, 7)}`,
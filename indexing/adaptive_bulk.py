@@ -0,0 +1,186 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from elasticsearch import helpers, ApiError, ConnectionError, ConnectionTimeout
+
+# -----------------------------
+# Defaults
+# -----------------------------
+MIN_BATCH       = 50
+MAX_BATCH       = 2000
+BATCH_STEP      = 50     # additive increase per healthy batch
+TARGET_LATENCY  = 30     # seconds per bulk request before we back off
+MAX_CONCURRENCY = 4      # bulk requests in flight
+
+MAX_RETRIES     = 5      # per action, for 429 / 5xx rejections, timeouts and connection errors
+INITIAL_BACKOFF = 2      # seconds, doubled per consecutive rejection
+MAX_BACKOFF     = 60
+REPORT_EVERY    = 30     # seconds between throughput reports
+
+# -----------------------------
+# AIMD bulk controller
+# -----------------------------
+class AdaptiveBulk:
+    """
+    Sends bulk requests whose size and concurrency follow the cluster.
+
+    Every healthy batch (no 429s, latency under target) grows the batch by
+    BATCH_STEP, and once batches are at the cap and well under target, one
+    more request is allowed in flight. A 429 or 5xx rejection, a connection
+    error or a slow / timed-out request halves the batch and drops one request
+    of concurrency, and the rejected actions are retried after a backoff;
+    actions still failing after MAX_RETRIES are reported as errors. With the ELSER pipeline in
+    the path this settles at the ML nodes' throughput ceiling.
+    """
+
+    def __init__(self, name, batch_size=500, concurrency=1, target_latency=TARGET_LATENCY,
+                 max_concurrency=MAX_CONCURRENCY, request_timeout=300):
+        self.name            = name
+        self.size            = batch_size
+        self.concurrency     = concurrency
+        self.max_concurrency = max(concurrency, max_concurrency)
+        self.target_latency  = target_latency
+        self.request_timeout = request_timeout
+
+        self._lock        = threading.Lock()
+        self._backoff     = 0
+        self._pause_until = 0.0
+        self._started     = None
+        self._last_report = 0.0
+        self.stats        = {"docs": 0, "errors": 0, "rejected": 0, "batches": 0}
+
+    # ----- AIMD -----
+    def _on_success(self, latency):
+        with self._lock:
+            self._backoff = 0
+            if latency > self.target_latency:
+                self._decrease()
+                return
+            self.size = min(MAX_BATCH, self.size + BATCH_STEP)
+            if self.size >= MAX_BATCH and latency < self.target_latency / 2:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+    def _on_pressure(self):
+        with self._lock:
+            self._decrease()
+            self._backoff     = min(MAX_BACKOFF, (self._backoff * 2) or INITIAL_BACKOFF)
+            self._pause_until = max(self._pause_until, time.time() + self._backoff)
+
+    def _decrease(self):
+        self.size        = max(MIN_BATCH, self.size // 2)
+        self.concurrency = max(1, self.concurrency - 1)
+
+    # ----- one request -----
+    def _send(self, client, batch):
+        """
+        Send one bulk request. Returns (results, retry) where results are
+        (ok, item) pairs and retry holds (attempt, action) pairs to resend.
+        """
+        wait = self._pause_until - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+        operations = []
+        for _, action in batch:
+            op, data = helpers.expand_action(action)
+            operations.append(op)
+            if data is not None:
+                operations.append(data)
+
+        started = time.time()
+        try:
+            resp = client.options(request_timeout=self.request_timeout).bulk(operations=operations)
+        except (ConnectionTimeout, ConnectionError, ApiError) as e:
+            # 4xx other than 429 means the request itself is bad; retrying won't help
+            if isinstance(e, ApiError) and e.meta.status != 429 and e.meta.status < 500:
+                raise
+            self._on_pressure()
+            return self._retry_or_fail(batch, {"error": str(e)})
+        latency = time.time() - started
+
+        results, retry = [], []
+        for (attempt, action), item in zip(batch, resp["items"]):
+            op_type, info = next(iter(item.items()))
+            if info.get("status") == 429:
+                if attempt < MAX_RETRIES:
+                    retry.append((attempt + 1, action))
+                else:
+                    results.append((False, item))
+            else:
+                results.append((not info.get("error"), item))
+
+        with self._lock:
+            self.stats["batches"]  += 1
+            self.stats["rejected"] += len(retry)
+        if retry:
+            self._on_pressure()
+        else:
+            self._on_success(latency)
+        return results, retry
+
+    def _retry_or_fail(self, batch, error):
+        results, retry = [], []
+        for attempt, action in batch:
+            if attempt < MAX_RETRIES:
+                retry.append((attempt + 1, action))
+            else:
+                results.append((False, {action.get("_op_type", "index"): {"_id": action.get("_id"), **error}}))
+        with self._lock:
+            self.stats["rejected"] += len(retry)
+        return results, retry
+
+    # ----- driver -----
+    def _next_batch(self, retry, actions):
+        batch = []
+        while retry and len(batch) < self.size:
+            batch.append(retry.popleft())
+        for action in actions:
+            batch.append((0, action))
+            if len(batch) >= self.size:
+                break
+        return batch
+
+    def bulk(self, client, actions):
+        """
+        Like helpers.streaming_bulk: index `actions` and yield (ok, item) for
+        each one. The action iterable is only consumed from this thread.
+        """
+        actions = iter(actions)
+        retry   = deque()
+        pending = deque()
+        self._started = self._started or time.time()
+
+        with ThreadPoolExecutor(self.max_concurrency) as pool:
+            while True:
+                while len(pending) < self.concurrency:
+                    batch = self._next_batch(retry, actions)
+                    if not batch:
+                        break
+                    pending.append(pool.submit(self._send, client, batch))
+
+                if not pending:
+                    if retry:
+                        continue
+                    break
+
+                results, rejected = pending.popleft().result()
+                retry.extend(rejected)
+                for ok, item in results:
+                    self.stats["docs" if ok else "errors"] += 1
+                    yield ok, item
+                self.report()
+
+    def report(self, force=False):
+        """Print throughput and the current batch size, at most every REPORT_EVERY seconds."""
+        now = time.time()
+        if not self._started or (not force and now - self._last_report < REPORT_EVERY):
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-6)
+        print(
+            f"  [bulk {self.name}] {self.stats['docs'] / elapsed:.1f} docs/s, "
+            f"batch {self.size}, concurrency {self.concurrency}, "
+            f"{self.stats['rejected']} rejected, {self.stats['errors']} errors",
+            flush=True
+        )
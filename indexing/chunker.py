@@ -1,23 +1,32 @@
-import os
 import sys
 import time
-from elasticsearch import Elasticsearch, helpers
+import queue
+import multiprocessing
+from elasticsearch import helpers
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
+from indexing.live_indexer import chunk_hash, stored_chunk_hashes, TAIL_PROBE
+from indexing.adaptive_bulk import AdaptiveBulk
 
 # -----------------------------
 # Environment
 # -----------------------------
 load_dotenv()
 
-ELASTIC_ENDPOINT = os.getenv("ELASTIC_ENDPOINT")
-ELASTIC_API_KEY  = os.getenv("ELASTIC_API_KEY")
-
 INDEX       = "elastic-copilot"
 CHUNK_INDEX = "elastic-copilot-chunks"
 
 CHUNK_SIZE    = 400   # words
 CHUNK_OVERLAP = 50
-BULK_SIZE     = 500    # small batches — ELSER inference is slow
+BULK_SIZE     = 500    # starting batch size — AdaptiveBulk tunes it to ELSER latency
+
+SCAN_PAGE_SIZE   = 1000  # source docs per scroll page
+SCROLL_KEEPALIVE = "30m" # long enough to cover the bulk requests between pages
+LOOKUP_BATCH     = 200   # source docs whose chunk ids are checked per mget
+
+CHUNK_WORKERS  = 1       # processes, each reading one slice of the source index
+BULK_THREADS   = 2       # starting bulk requests in flight per worker process
+PROGRESS_EVERY = 100     # chunk results between progress reports
 
 CHUNK_MAPPING = {
     "settings": {
@@ -34,10 +43,11 @@ CHUNK_MAPPING = {
             "title_embedding": { "type": "sparse_vector" },
             "author":          { "type": "keyword" },
             "labels":          { "type": "keyword" },
-            "status":          { "type": "keyword" },
+            "status":          { "type": "keyword" },   # legacy; read status from the parent
             "url":             { "type": "keyword" },
             "number":          { "type": "integer" },
-            "created_at":      { "type": "date" }
+            "created_at":      { "type": "date" },
+            "content_hash":    { "type": "keyword" }
         }
     }
 }
@@ -45,11 +55,8 @@ CHUNK_MAPPING = {
 # -----------------------------
 # Elasticsearch client
 # -----------------------------
-es = Elasticsearch(
-    ELASTIC_ENDPOINT,
-    api_key=ELASTIC_API_KEY,
-    request_timeout=300
-)
+# Shared and created on first use, so each worker process gets its own
+es = lazy_client("bulk")
 
 # -----------------------------
 # Chunking logic
@@ -67,88 +74,130 @@ def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     return chunks
 
 # -----------------------------
-# Fetch all source docs (scroll)
+# Stream source docs (scroll)
 # -----------------------------
-def fetch_all_docs():
-    es.indices.refresh(index=INDEX)
-    docs = []
-
-    page = es.search(
+def iter_docs(slice_id=None, max_slices=None):
+    """
+    Yield every source doc one scroll page at a time instead of holding them
+    all. With max_slices > 1 only slice `slice_id` of a sliced scroll is read.
+    """
+    query = {"query": {"match_all": {}}}
+    if max_slices and max_slices > 1:
+        query["slice"] = {"id": slice_id, "max": max_slices}
+
+    yield from helpers.scan(
+        es,
         index=INDEX,
-        body={
-            "size": 1000,
-            "query": {"match_all": {}}
-        },
-        scroll="5m"
+        query=query,
+        size=SCAN_PAGE_SIZE,
+        scroll=SCROLL_KEEPALIVE
     )
 
-    scroll_id = page["_scroll_id"]
-    hits = page["hits"]["hits"]
-
-    while hits:
-        docs.extend(hits)
-        page = es.scroll(scroll_id=scroll_id, scroll="5m")
-        scroll_id = page["_scroll_id"]
-        hits = page["hits"]["hits"]
+def count_docs():
+    return es.count(index=INDEX)["count"]
 
-    return docs
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 # -----------------------------
-# Get already-indexed chunk IDs
+# Build chunk documents (skip unchanged)
 # -----------------------------
-def get_existing_chunk_ids():
-    if not es.indices.exists(index=CHUNK_INDEX):
-        return set()
-
-    ids = set()
-    for doc in helpers.scan(es, index=CHUNK_INDEX, query={"query": {"match_all": {}}}, _source=False):
-        ids.add(doc["_id"])
-    return ids
-
-# -----------------------------
-# Build chunk documents (skip existing)
-# -----------------------------
-def build_chunk_docs(docs, existing_ids):
-    skipped = 0
-    generated = 0
-
-    for doc in docs:
-        src = doc["_source"]
-
-        text = f"{src.get('title', '')} {src.get('body', '')}".strip()
-        if not text:
-            continue
-
-        chunks = chunk_text(text)
-
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"{doc['_id']}-chunk-{i}"
-
-            if chunk_id in existing_ids:
-                skipped += 1
+def chunk_actions(doc):
+    src  = doc["_source"]
+    text = f"{src.get('title', '')} {src.get('body', '')}".strip()
+    if not text:
+        return []
+
+    title = src.get("title", "")
+    return [
+        {
+            "_index": CHUNK_INDEX,
+            "_id": f"{doc['_id']}-chunk-{i}",
+            "_source": {
+                "parent_doc_id": doc["_id"],
+                "chunk_index": i,
+                "type": src.get("type"),
+                "author": src.get("author"),
+                "labels": src.get("labels", []),
+                "url": src.get("url"),
+                "number": src.get("number"),
+                "created_at": src.get("created_at"),
+                "title": title,
+                "body": chunk,
+                "content_hash": chunk_hash(title, chunk)
+            }
+        }
+        for i, chunk in enumerate(chunk_text(text))
+    ]
+
+def stored_chunk_ids(doc, count):
+    """
+    Ids of the chunks that may exist for `doc`: its `count` new ones plus any
+    tail left by a longer version. Docs without a recorded chunk_count are
+    probed TAIL_PROBE ids past the new end, as in live_indexer.
+    """
+    previous = doc["_source"].get("chunk_count")
+    total    = max(count, previous if previous is not None else count + TAIL_PROBE)
+    return [f"{doc['_id']}-chunk-{i}" for i in range(total)]
+
+def build_chunk_docs(docs, stats=None):
+    """
+    Lazily turn a stream of source docs into bulk actions. Docs are taken
+    LOOKUP_BATCH at a time and their chunks' content hashes compared with the
+    chunk index, so memory stays flat no matter how large the corpus is and
+    only new or edited chunks go through the ELSER pipeline. Chunks past the
+    new end of a doc that got shorter are deleted, and the parent's
+    chunk_count is updated so the next run knows where its chunks end.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("docs", 0)
+    stats.setdefault("skipped", 0)
+
+    for batch in _batched(docs, LOOKUP_BATCH):
+        per_doc        = [(doc, chunk_actions(doc)) for doc in batch]
+        stored, legacy = stored_chunk_hashes(
+            es, [cid for doc, acts in per_doc for cid in stored_chunk_ids(doc, len(acts))]
+        )
+        stats["docs"] += len(batch)
+
+        # Orphaned tails from longer previous versions
+        for doc, acts in per_doc:
+            for chunk_id in stored_chunk_ids(doc, len(acts))[len(acts):]:
+                if chunk_id in stored:
+                    yield {"_op_type": "delete", "_index": CHUNK_INDEX, "_id": chunk_id}
+
+        for action in (a for _, acts in per_doc for a in acts):
+            content_hash = action["_source"]["content_hash"]
+            if stored.get(action["_id"]) != content_hash:
+                yield action
                 continue
 
-            generated += 1
-            yield {
-                "_index": CHUNK_INDEX,
-                "_id": chunk_id,
-                "_source": {
-                    "parent_doc_id": doc["_id"],
-                    "chunk_index": i,
-                    "type": src.get("type"),
-                    "author": src.get("author"),
-                    "labels": src.get("labels", []),
-                    "status": src.get("status"),
-                    "url": src.get("url"),
-                    "number": src.get("number"),
-                    "created_at": src.get("created_at"),
-                    "title": src.get("title", ""),
-                    "body": chunk
+            stats["skipped"] += 1
+            if action["_id"] in legacy:
+                # Same text, written before hashes were stored: record the hash only
+                yield {
+                    "_op_type": "update",
+                    "_index":   CHUNK_INDEX,
+                    "_id":      action["_id"],
+                    "doc":      {"content_hash": content_hash}
                 }
-            }
 
-    if skipped:
-        print(f"  (skipped {skipped} already-indexed chunks)")
+        # Where each doc's chunks now end, for the next run's tail check
+        for doc, acts in per_doc:
+            if doc["_source"].get("chunk_count") != len(acts):
+                yield {
+                    "_op_type": "update",
+                    "_index":   INDEX,
+                    "_id":      doc["_id"],
+                    "doc":      {"chunk_count": len(acts)}
+                }
 
 # -----------------------------
 # Ensure chunk index exists
@@ -158,6 +207,10 @@ def ensure_chunk_index():
         es.indices.create(index=CHUNK_INDEX, body=CHUNK_MAPPING)
         print("Created chunk index")
     else:
+        es.indices.put_mapping(
+            index=CHUNK_INDEX,
+            properties={"content_hash": CHUNK_MAPPING["mappings"]["properties"]["content_hash"]}
+        )
         print("Chunk index already exists (resuming)")
 
     # Clean up failed index
@@ -166,6 +219,98 @@ def ensure_chunk_index():
         es.indices.delete(index=failed)
         print(f"Deleted {failed}")
 
+# -----------------------------
+# Single-process run
+# -----------------------------
+def run_single():
+    success = 0
+    errors = 0
+    stats = {}
+    writer = AdaptiveBulk("chunker", batch_size=BULK_SIZE)
+
+    for ok, info in writer.bulk(es, build_chunk_docs(iter_docs(), stats)):
+        if ok:
+            success += 1
+        else:
+            errors += 1
+
+        if (success + errors) % PROGRESS_EVERY == 0:
+            print(f"  progress: {stats['docs']} docs, {success} ok / {errors} err", flush=True)
+
+    writer.report(force=True)
+    return success, errors, stats.get("skipped", 0)
+
+# -----------------------------
+# Sliced multi-process run
+# -----------------------------
+def index_slice(slice_id, max_slices, progress):
+    """
+    Worker process: chunk and embed one slice of the source index with its
+    own client and bulk controller, reporting running totals on `progress`.
+    """
+    success = 0
+    errors = 0
+    stats = {}
+    writer = AdaptiveBulk(f"chunker-{slice_id}", batch_size=BULK_SIZE, concurrency=BULK_THREADS)
+
+    def report(done=False):
+        progress.put((slice_id, stats.get("docs", 0), success, errors, stats.get("skipped", 0), done))
+
+    for ok, info in writer.bulk(es, build_chunk_docs(iter_docs(slice_id, max_slices), stats)):
+        if ok:
+            success += 1
+        else:
+            errors += 1
+
+        if (success + errors) % PROGRESS_EVERY == 0:
+            report()
+
+    writer.report(force=True)
+    report(done=True)
+
+def run_parallel(workers):
+    """Run one index_slice process per slice and aggregate their progress."""
+    ctx      = multiprocessing.get_context("spawn")
+    progress = ctx.Queue()
+    procs    = [
+        ctx.Process(target=index_slice, args=(i, workers, progress), daemon=True)
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+
+    totals   = {}
+    finished = set()
+    while len(finished) < workers:
+        try:
+            slice_id, docs, ok, err, skipped, done = progress.get(timeout=5)
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs):
+                break   # a worker died without reporting completion
+            continue
+
+        totals[slice_id] = (docs, ok, err, skipped)
+        if done:
+            finished.add(slice_id)
+
+        docs, ok, err, _ = (sum(col) for col in zip(*totals.values()))
+        print(
+            f"  progress: {docs} docs, {ok} ok / {err} err "
+            f"({len(finished)}/{workers} slices done)", flush=True
+        )
+
+    for p in procs:
+        p.join()
+
+    failed = [i for i, p in enumerate(procs) if p.exitcode != 0]
+    if failed:
+        print(f"  slices {failed} exited with errors — rerun to pick up what they missed")
+
+    if not totals:
+        return 0, 0, 0
+    _, success, errors, skipped = (sum(col) for col in zip(*totals.values()))
+    return success, errors, skipped
+
 # -----------------------------
 # Main
 # -----------------------------
@@ -174,6 +319,11 @@ if __name__ == "__main__":
     # Pass --reset to wipe and start fresh
     fresh = "--reset" in sys.argv
 
+    # Pass --workers N to split the source index into N sliced-scroll processes
+    workers = CHUNK_WORKERS
+    if "--workers" in sys.argv:
+        workers = max(1, int(sys.argv[sys.argv.index("--workers") + 1]))
+
     print("Starting chunking + embedding")
 
     if fresh:
@@ -183,37 +333,17 @@ if __name__ == "__main__":
 
     ensure_chunk_index()
 
-    print("Fetching source documents...")
-    docs = fetch_all_docs()
-    print(f"Found {len(docs)} source documents")
-
-    print("Checking already-indexed chunks...")
-    existing_ids = get_existing_chunk_ids()
-    print(f"Already indexed: {len(existing_ids)} chunks")
-
+    es.indices.refresh(index=INDEX)
+    print(f"Streaming {count_docs()} source documents")
     print("Chunking + embedding (this will take a while)...")
-    success = 0
-    errors = 0
 
-    for ok, info in helpers.streaming_bulk(
-        es,
-        build_chunk_docs(docs, existing_ids),
-        chunk_size=BULK_SIZE,
-        raise_on_error=False,
-        raise_on_exception=False,
-        max_retries=3,
-        initial_backoff=10,
-        max_backoff=60,
-        request_timeout=300
-    ):
-        if ok:
-            success += 1
-        else:
-            errors += 1
-
-        if (success + errors) % 100 == 0:
-            print(f"  progress: {success} ok / {errors} err", flush=True)
+    if workers > 1:
+        print(f"  {workers} worker processes x {BULK_THREADS} bulk threads")
+        success, errors, skipped = run_parallel(workers)
+    else:
+        success, errors, skipped = run_single()
 
+    if skipped:
+        print(f"  (skipped {skipped} unchanged chunks)")
     print(f"\nDone! Indexed {success} chunks. Errors: {errors}")
     print(f"Total in index: {es.count(index=CHUNK_INDEX)['count']}")
-
@@ -1,177 +1,349 @@
 import os
+import sys
 import time
-import requests
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
 from requests.exceptions import RequestException
-from elasticsearch import Elasticsearch, helpers
+from tools.es_client import lazy_client
+from indexing.adaptive_bulk import AdaptiveBulk
 from dotenv import load_dotenv
+from tools.github_client import github_get as conditional_get
+from tools.github_graphql import iter_pages
+from tools.rate_limiter import github_priority
 
 # -----------------------------
 # Environment setup
 # -----------------------------
 load_dotenv()
 
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 REPO         = os.getenv("GITHUB_REPO")          # e.g. elastic/elasticsearch
-ELASTIC_EP   = os.getenv("ELASTIC_ENDPOINT")
-ELASTIC_KEY  = os.getenv("ELASTIC_API_KEY")
 
 INDEX = "elastic-copilot"
-BULK_SIZE = 500          # safe chunk size
+SYNC_STATE_INDEX = "sync-state"
+BULK_SIZE = 500          # starting chunk size — AdaptiveBulk tunes it
 REQUEST_TIMEOUT = 30     # seconds
+CRAWL_WORKERS = 1        # concurrent page fetchers (--workers N)
 
 # -----------------------------
 # Elasticsearch client
 # -----------------------------
-es = Elasticsearch(
-    ELASTIC_EP,
-    api_key=ELASTIC_KEY
-)
+es = lazy_client("bulk")
 
 # -----------------------------
-# GitHub headers
+# GitHub request helper (retry + rate-limit safe)
 # -----------------------------
-HEADERS = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
+def github_request(url, params=None):
+    """GET a single GitHub page, retrying network errors. Rate limits are paced by the shared limiter."""
+    while True:
+        try:
+            resp = conditional_get(
+                url,
+                params,
+                timeout=REQUEST_TIMEOUT,
+                use_cache=False,       # one-shot backfill, don't fill the ETag store
+                priority="backfill"
+            )
+            resp.raise_for_status()
+            return resp
+
+        except RequestException as e:
+            print(f"[Network error] {e}. Retrying in 10s...")
+            time.sleep(10)
 
 # -----------------------------
-# GitHub fetch helper (pagination + retry + rate-limit safe)
+# GitHub fetch helper (pagination via Link: next)
 # -----------------------------
 def github_get(url, params=None):
     if params is None:
         params = {}
 
     while url:
-        try:
-            resp = requests.get(
-                url,
-                headers=HEADERS,
-                params=params,
-                timeout=REQUEST_TIMEOUT
-            )
+        resp = github_request(url, params)
 
-            # Rate limit handling
-            if resp.status_code == 403:
-                reset = int(resp.headers.get("X-RateLimit-Reset", time.time() + 60))
-                wait = max(reset - int(time.time()), 0) + 5
-                print(f"[Rate limit] Sleeping {wait}s...")
-                time.sleep(wait)
-                continue
+        yield from resp.json()
 
-            resp.raise_for_status()
+        # Pagination
+        url = resp.links.get("next", {}).get("url")
+        params = {}
 
-            yield from resp.json()
+# -----------------------------
+# Concurrent page fan-out (pagination via Link: last)
+# -----------------------------
+def get_last_page(resp):
+    """Read the last page number from a GitHub `Link` header (1 if there is none)."""
+    last_url = resp.links.get("last", {}).get("url")
+    if not last_url:
+        return 1
+    page = parse_qs(urlparse(last_url).query).get("page", ["1"])[0]
+    return int(page)
 
-            # Pagination
-            url = resp.links.get("next", {}).get("url")
-            params = {}
+def github_get_pages(url, params=None, workers=CRAWL_WORKERS, start_page=1):
+    """
+    Yield (page_number, items) for every page of a GitHub listing from start_page on,
+    in page order. The first request discovers the last page from the `Link` header;
+    the rest are fetched by a bounded worker pool that keeps at most 2x workers pages
+    in flight.
+    """
+    params = dict(params or {})
 
-        except RequestException as e:
-            print(f"[Network error] {e}. Retrying in 10s...")
-            time.sleep(10)
-            continue
+    first = github_request(url, {**params, "page": start_page})
+    last_page = max(get_last_page(first), start_page)
+    print(f"  pages {start_page}..{last_page} to fetch with {workers} worker(s)")
+    yield start_page, first.json()
+
+    if last_page <= start_page:
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        next_page = start_page + 1
+
+        while next_page <= last_page or in_flight:
+            while next_page <= last_page and len(in_flight) < workers * 2:
+                future = pool.submit(github_request, url, {**params, "page": next_page})
+                in_flight.append((next_page, future))
+                next_page += 1
+
+            page, future = in_flight.popleft()
+            yield page, future.result().json()
 
 # -----------------------------
-# Stream & index issues + PRs
+# Crawl checkpoints (stored in the sync-state index)
 # -----------------------------
-def index_issues_and_prs():
-    print("Fetching issues and PRs...")
-    url = f"https://api.github.com/repos/{REPO}/issues"
-    params = {"state": "all", "per_page": 100}
+def get_checkpoint(stream):
+    """Read the saved crawl cursor for a stream, or None if there is none."""
+    try:
+        doc = es.get(index=SYNC_STATE_INDEX, id=f"crawl-{stream}")
+        return doc["_source"]
+    except Exception:
+        return None
 
-    buffer = []
-    count = 0
+def save_checkpoint(stream, last_page, last_updated_at, total, completed=False, cursor=None):
+    """Persist the last fully indexed page so a crashed backfill can resume after it."""
+    es.index(
+        index=SYNC_STATE_INDEX,
+        id=f"crawl-{stream}",
+        document={
+            "sync_type":       f"crawl-{stream}",
+            "last_page":       last_page,
+            "cursor":          cursor,
+            "last_updated_at": last_updated_at,
+            "total":           total,
+            "completed":       completed,
+            "checkpointed_at": datetime.utcnow().isoformat()
+        }
+    )
+
+# -----------------------------
+# Bulk-indexing stage
+# -----------------------------
+bulk_writer = AdaptiveBulk("crawler", batch_size=BULK_SIZE)
+
+def flush_bulk(buffer):
+    errors = [item for ok, item in bulk_writer.bulk(es, buffer) if not ok]
+    if errors:
+        print(f"Failed to index {len(errors)} documents. First error: {errors[0]}")
+        # continue processing next batch
+    buffer.clear()
 
-    for item in github_get(url, params):
-        is_pr = "pull_request" in item
-
-        doc = {
-            "_index": INDEX,
-            "_id": f"{'pr' if is_pr else 'issue'}-{item['number']}",
-            "_source": {
-                "id": str(item["id"]),
-                "type": "pr" if is_pr else "issue",
-                "title": item.get("title", ""),
-                "body": item.get("body", "") or "",
-                "author": item["user"]["login"],
-                "labels": [l["name"] for l in item.get("labels", [])],
-                "status": item.get("state", ""),
-                "created_at": item.get("created_at"),
-                "updated_at": item.get("updated_at"),
-                "url": item.get("html_url", ""),
-                "number": item["number"],
-            }
+# -----------------------------
+# GitHub item -> bulk action
+# -----------------------------
+def issue_to_action(item):
+    is_pr = "pull_request" in item
+
+    # A partial update, so fields the indexers keep on the parent (chunk_count)
+    # survive a re-crawl
+    return {
+        "_op_type": "update",
+        "_index": INDEX,
+        "_id": f"{'pr' if is_pr else 'issue'}-{item['number']}",
+        "doc_as_upsert": True,
+        "doc": {
+            "id": str(item["id"]),
+            "type": "pr" if is_pr else "issue",
+            "title": item.get("title", ""),
+            "body": item.get("body", "") or "",
+            "author": item["user"]["login"],
+            "labels": [l["name"] for l in item.get("labels", [])],
+            "status": item.get("state", ""),
+            "created_at": item.get("created_at"),
+            "updated_at": item.get("updated_at"),
+            "url": item.get("html_url", ""),
+            "number": item["number"],
+        }
+    }
+
+def comment_to_action(item):
+    issue_number = int(item["issue_url"].split("/")[-1])
+
+    return {
+        "_index": INDEX,
+        "_id": f"comment-{item['id']}",
+        "_source": {
+            "id": str(item["id"]),
+            "type": "comment",
+            "body": item.get("body", "") or "",
+            "author": item["user"]["login"],
+            "created_at": item.get("created_at"),
+            "updated_at": item.get("updated_at"),
+            "url": item.get("html_url", ""),
+            "parent_id": f"issue-{issue_number}",
+            "title": "",
+            "labels": [],
+            "status": "",
+            "number": issue_number
         }
+    }
+
+def crawl(stream, url, params, to_action, workers=CRAWL_WORKERS, resume=False):
+    """
+    Fan pages out over `workers` fetchers and feed every item into one bulk stage.
+    Buffers are flushed on page boundaries, and each flush checkpoints the last
+    page it contained, so `resume=True` restarts right after the last indexed page.
+    """
+    start_page = 1
+    count = 0
+    last_updated_at = None
 
-        buffer.append(doc)
-        count += 1
+    checkpoint = get_checkpoint(stream) if resume else None
+    if checkpoint:
+        if checkpoint.get("completed"):
+            print(f"  {stream}: already complete ({checkpoint['total']} items), skipping")
+            return 0
+        start_page = checkpoint["last_page"] + 1
+        count = checkpoint.get("total", 0)
+        last_updated_at = checkpoint.get("last_updated_at")
+        print(f"  {stream}: resuming after page {checkpoint['last_page']} ({count} items already indexed)")
 
-        if len(buffer) >= BULK_SIZE:
-            try:
-                helpers.bulk(es, buffer)
-                print(f"Indexed {count} issues/PRs...")
-            except helpers.BulkIndexError as e:
-                print(f"Failed to index {len(e.errors)} documents. First error: {e.errors[0]}")
-                # continue processing next batch
-            buffer.clear()
+    buffer = []
+    last_page = start_page - 1
+
+    for page, items in github_get_pages(url, params, workers, start_page):
+        for item in items:
+            buffer.append(to_action(item))
+            updated_at = item.get("updated_at")
+            if updated_at and (last_updated_at is None or updated_at > last_updated_at):
+                last_updated_at = updated_at
+        count += len(items)
+        last_page = page
+
+        if len(buffer) >= bulk_writer.size:
+            flush_bulk(buffer)
+            save_checkpoint(stream, last_page, last_updated_at, count)
+            print(f"Indexed {count} {stream} (page {last_page})...")
 
     if buffer:
-        helpers.bulk(es, buffer)
-        print(f"Indexed final batch. Total issues/PRs: {count}")
+        flush_bulk(buffer)
+    save_checkpoint(stream, last_page, last_updated_at, count, completed=True)
+    print(f"Indexed final batch. Total {stream}: {count}")
+    return count
+
+# -----------------------------
+# Stream & index issues + PRs
+# -----------------------------
+def index_issues_and_prs(workers=CRAWL_WORKERS, resume=False):
+    print("Fetching issues and PRs...")
+    url = f"https://api.github.com/repos/{REPO}/issues"
+    # Oldest-first keeps page boundaries stable while new items are opened mid-crawl
+    params = {"state": "all", "per_page": 100, "sort": "created", "direction": "asc"}
+
+    return crawl("issues", url, params, issue_to_action, workers, resume)
 
 # -----------------------------
 # Stream & index comments
 # -----------------------------
-def index_comments():
+def index_comments(workers=CRAWL_WORKERS, resume=False):
     print("Fetching comments...")
     url = f"https://api.github.com/repos/{REPO}/issues/comments"
-    params = {"per_page": 100}
+    params = {"per_page": 100, "sort": "created", "direction": "asc"}
 
-    buffer = []
-    count = 0
+    return crawl("comments", url, params, comment_to_action, workers, resume)
 
-    for item in github_get(url, params):
-        issue_number = int(item["issue_url"].split("/")[-1])
-
-        doc = {
-            "_index": INDEX,
-            "_id": f"comment-{item['id']}",
-            "_source": {
-                "id": str(item["id"]),
-                "type": "comment",
-                "body": item.get("body", "") or "",
-                "author": item["user"]["login"],
-                "created_at": item.get("created_at"),
-                "updated_at": item.get("updated_at"),
-                "url": item.get("html_url", ""),
-                "parent_id": f"issue-{issue_number}",
-                "title": "",
-                "labels": [],
-                "status": "",
-                "number": issue_number
-            }
-        }
+# -----------------------------
+# GraphQL ingestion (items + comments in one query)
+# -----------------------------
+def graphql_item_actions(item):
+    """Bulk actions for one GraphQL item and all of its comments."""
+    yield issue_to_action(item)
+
+    comments = item["recent_comments"]
+    if item["comments"] > len(comments):
+        # Only the most recent comments come inline; page the rest over REST
+        url = f"https://api.github.com/repos/{REPO}/issues/{item['number']}/comments"
+        comments = github_get(url, {"per_page": 100})
 
-        buffer.append(doc)
-        count += 1
+    for comment in comments:
+        yield comment_to_action(comment)
 
-        if len(buffer) >= BULK_SIZE:
-            helpers.bulk(es, buffer)
-            print(f"Indexed {count} comments...")
-            buffer.clear()
+def crawl_graphql(connection, resume=False):
+    """
+    Backfill `issues` or `pullRequests` with their labels, state, merge status
+    and comments via GraphQL. Checkpoints store the page cursor.
+    """
+    stream = f"graphql-{connection}"
+    after  = None
+    page   = 0
+    count  = 0
+    last_updated_at = None
+
+    checkpoint = get_checkpoint(stream) if resume else None
+    if checkpoint:
+        if checkpoint.get("completed"):
+            print(f"  {stream}: already complete ({checkpoint['total']} items), skipping")
+            return 0
+        after = checkpoint.get("cursor")
+        page  = checkpoint["last_page"]
+        count = checkpoint.get("total", 0)
+        last_updated_at = checkpoint.get("last_updated_at")
+        print(f"  {stream}: resuming after page {page} ({count} items already indexed)")
+
+    buffer = []
+
+    # Backfill priority, so the crawl can't spend the GraphQL quota the
+    # webhook path keeps in reserve
+    with github_priority("backfill"):
+        for after, items in iter_pages(connection, after=after):
+            for item in items:
+                buffer.extend(graphql_item_actions(item))
+                if last_updated_at is None or item["updated_at"] > last_updated_at:
+                    last_updated_at = item["updated_at"]
+            count += len(items)
+            page  += 1
+
+            if len(buffer) >= bulk_writer.size:
+                flush_bulk(buffer)
+                save_checkpoint(stream, page, last_updated_at, count, cursor=after)
+                print(f"Indexed {count} {connection} (page {page})...")
 
     if buffer:
-        helpers.bulk(es, buffer)
-        print(f"Indexed final batch. Total comments: {count}")
+        flush_bulk(buffer)
+    save_checkpoint(stream, page, last_updated_at, count, completed=True, cursor=after)
+    print(f"Indexed final batch. Total {connection}: {count}")
+    return count
 
 # -----------------------------
 # Main execution
 # -----------------------------
 if __name__ == "__main__":
+    # Pass --workers N to fetch N pages concurrently
+    workers = CRAWL_WORKERS
+    if "--workers" in sys.argv:
+        workers = max(1, int(sys.argv[sys.argv.index("--workers") + 1]))
+
+    # Pass --resume to continue from the last checkpoint instead of page 1
+    resume = "--resume" in sys.argv
+
     print("Starting full GitHub ingestion 🚀")
 
-    index_issues_and_prs()
-    index_comments()
+    # Pass --graphql to pull items with their comments in batched GraphQL queries
+    if "--graphql" in sys.argv:
+        crawl_graphql("issues", resume)
+        crawl_graphql("pullRequests", resume)
+    else:
+        index_issues_and_prs(workers, resume)
+        index_comments(workers, resume)
 
     print("Done. Full backfill complete ✅")
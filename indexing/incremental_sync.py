@@ -1,30 +1,21 @@
 import os
 import time
-import requests
 from datetime import datetime, timezone
-from elasticsearch import Elasticsearch
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
 from indexing.live_indexer import index_issue, index_comment
+from tools.github_client import github_paginate
+from tools.github_graphql import fetch_updated_items
+from tools.rate_limiter import github_priority
 
 load_dotenv()
 
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-REPO         = os.getenv("GITHUB_REPO")
-HEADERS      = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
+REPO = os.getenv("GITHUB_REPO")
 
-ELASTIC_ENDPOINT = os.getenv("ELASTIC_ENDPOINT")
-ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY")
-ELASTIC_CLOUD_ID = os.getenv("ELASTIC_CLOUD_ID")
+# Set GITHUB_SYNC_GRAPHQL=true (or pass --graphql) to sync via batched GraphQL queries
+USE_GRAPHQL = os.getenv("GITHUB_SYNC_GRAPHQL", "").lower() in ("1", "true", "yes")
 
-if ELASTIC_CLOUD_ID:
-    es = Elasticsearch(cloud_id=ELASTIC_CLOUD_ID, api_key=ELASTIC_API_KEY, request_timeout=30)
-elif ELASTIC_ENDPOINT:
-    es = Elasticsearch(ELASTIC_ENDPOINT, api_key=ELASTIC_API_KEY, request_timeout=30)
-else:
-    es = None
+es = lazy_client("write")
 
 SYNC_STATE_INDEX = "sync-state"
 
@@ -61,26 +52,12 @@ def sync_new_issues(since):
     }
 
     indexed = 0
-    while url:
-        resp = requests.get(url, headers=HEADERS, params=params)
-
-        if resp.status_code == 403:
-            reset = int(resp.headers.get("X-RateLimit-Reset", time.time() + 60))
-            wait  = max(reset - int(time.time()), 0) + 5
-            print(f"Rate limited. Waiting {wait}s...")
-            time.sleep(wait)
-            continue
-
-        items = resp.json()
-        for item in items:
-            try:
-                index_issue(item)
-                indexed += 1
-            except Exception as e:
-                print(f"Failed to index item #{item.get('number')}: {e}")
-
-        url    = resp.links.get("next", {}).get("url")
-        params = {}
+    for item in github_paginate(url, params):   # rate limits are paced by the shared limiter
+        try:
+            index_issue(item)
+            indexed += 1
+        except Exception as e:
+            print(f"Failed to index item #{item.get('number')}: {e}")
 
     return indexed
 
@@ -95,32 +72,73 @@ def sync_new_comments(since):
     }
 
     indexed = 0
-    while url:
-        resp   = requests.get(url, headers=HEADERS, params=params)
-        resp.raise_for_status()
-        items  = resp.json()
+    for item in github_paginate(url, params):
+        try:
+            issue_number = int(item["issue_url"].split("/")[-1])
+            index_comment(item, issue_number)
+            indexed += 1
+        except Exception as e:
+            print(f"Failed to index comment {item.get('id')}: {e}")
 
-        for item in items:
+    return indexed
+
+def as_github_time(ts):
+    """Normalise a stored sync timestamp to GitHub's YYYY-MM-DDTHH:MM:SSZ form."""
+    dt = datetime.fromisoformat(ts)
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def sync_via_graphql(since_issues, since_comments):
+    """
+    Fetch issues and PRs updated since the last sync with their most recent
+    comments in one paginated GraphQL query per page, instead of separate
+    REST listings for items and comments.
+    """
+    since_issues     = as_github_time(since_issues)
+    since_comments   = as_github_time(since_comments)
+    indexed_items    = 0
+    indexed_comments = 0
+
+    for item in fetch_updated_items(min(since_issues, since_comments)):
+        if item["updated_at"] >= since_issues:
             try:
-                issue_number = int(item["issue_url"].split("/")[-1])
-                index_comment(item, issue_number)
-                indexed += 1
+                index_issue(item)
+                indexed_items += 1
             except Exception as e:
-                print(f"Failed to index comment {item.get('id')}: {e}")
+                print(f"Failed to index item #{item.get('number')}: {e}")
 
-        url    = resp.links.get("next", {}).get("url")
-        params = {}
+        comments = item["recent_comments"]
+        if item["comments"] > len(comments):
+            # Only the most recent comments come inline; page the rest over REST
+            url      = f"https://api.github.com/repos/{REPO}/issues/{item['number']}/comments"
+            comments = github_paginate(url, {"since": since_comments})
 
-    return indexed
+        for comment in comments:
+            if comment["updated_at"] < since_comments:
+                continue
+            try:
+                index_comment(comment, item["number"])
+                indexed_comments += 1
+            except Exception as e:
+                print(f"Failed to index comment {comment.get('id')}: {e}")
+
+    return indexed_items, indexed_comments
 
-def run_incremental_sync():
+def run_incremental_sync(use_graphql=None):
+    if use_graphql is None:
+        use_graphql = USE_GRAPHQL
     print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Running incremental sync...")
 
     since_issues   = get_last_sync_time("issues")
     since_comments = get_last_sync_time("comments")
 
-    issues_indexed   = sync_new_issues(since_issues)
-    comments_indexed = sync_new_comments(since_comments)
+    with github_priority("sync"):
+        if use_graphql:
+            issues_indexed, comments_indexed = sync_via_graphql(since_issues, since_comments)
+        else:
+            issues_indexed   = sync_new_issues(since_issues)
+            comments_indexed = sync_new_comments(since_comments)
 
     set_last_sync_time("issues")
     set_last_sync_time("comments")
@@ -140,7 +158,9 @@ def run_polling_loop(interval_seconds=900):
 
 if __name__ == "__main__":
     import sys
+    if "--graphql" in sys.argv:
+        USE_GRAPHQL = True
     if "--once" in sys.argv:
-        run_incremental_sync()
+        run_incremental_sync(USE_GRAPHQL)
     else:
         run_polling_loop()
\ No newline at end of file
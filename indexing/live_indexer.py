@@ -1,20 +1,14 @@
-import os
+import atexit
+import hashlib
+import threading
 from datetime import datetime
-from elasticsearch import Elasticsearch
+from elasticsearch import helpers
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
-ELASTIC_ENDPOINT = os.getenv("ELASTIC_ENDPOINT")
-ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY")
-ELASTIC_CLOUD_ID = os.getenv("ELASTIC_CLOUD_ID")
-
-if ELASTIC_CLOUD_ID:
-    es = Elasticsearch(cloud_id=ELASTIC_CLOUD_ID, api_key=ELASTIC_API_KEY, request_timeout=30)
-elif ELASTIC_ENDPOINT:
-    es = Elasticsearch(ELASTIC_ENDPOINT, api_key=ELASTIC_API_KEY, request_timeout=30)
-else:
-    es = None
+es = lazy_client("write")
 
 INDEX       = "elastic-copilot"
 CHUNK_INDEX = "elastic-copilot-chunks"
@@ -22,6 +16,11 @@ CHUNK_INDEX = "elastic-copilot-chunks"
 CHUNK_SIZE    = 400
 CHUNK_OVERLAP = 50
 
+TAIL_PROBE = 8   # extra chunk ids checked when a parent has no recorded chunk_count
+
+FLUSH_INTERVAL = 0.05   # seconds the write-behind queue collects ops before flushing
+FLUSH_MAX_OPS  = 200    # flush early once this many documents are queued
+
 def chunk_text(text):
     words  = text.split()
     chunks = []
@@ -32,11 +31,65 @@ def chunk_text(text):
         start += CHUNK_SIZE - CHUNK_OVERLAP
     return chunks
 
-def index_issue(issue_data):
+# -----------------------------
+# Chunk content hashes
+# -----------------------------
+# ELSER inference is the most expensive step of ingest, so chunks carry a hash
+# of the text it embeds and writers only send chunks whose hash changed.
+def chunk_hash(title, body):
+    """Fingerprint of the text the ELSER pipeline embeds for one chunk."""
+    return hashlib.sha1(f"{title or ''}\n{body or ''}".encode()).hexdigest()
+
+def stored_chunk_hashes(client, chunk_ids):
+    """
+    Returns ({chunk_id: content_hash}, legacy_ids) for the chunks that already
+    exist. Chunks written before hashes were stored are hashed from their
+    stored text and listed in legacy_ids so callers can backfill the field.
+    """
+    if not chunk_ids:
+        return {}, set()
+
+    resp   = client.mget(index=CHUNK_INDEX, ids=chunk_ids, _source_includes=["content_hash"])
+    found  = [d for d in resp["docs"] if d.get("found")]
+    hashes = {d["_id"]: d["_source"].get("content_hash") for d in found}
+    legacy = {cid for cid, h in hashes.items() if not h}
+
+    if legacy:
+        resp = client.mget(index=CHUNK_INDEX, ids=list(legacy), _source_includes=["title", "body"])
+        for d in resp["docs"]:
+            if d.get("found"):
+                hashes[d["_id"]] = chunk_hash(d["_source"].get("title"), d["_source"].get("body"))
+
+    return hashes, legacy
+
+def previous_chunk_counts(client, parent_ids):
+    """{parent_doc_id: chunk_count} as last written; None for docs that predate the field."""
+    if not parent_ids:
+        return {}
+    resp = client.mget(index=INDEX, ids=parent_ids, _source_includes=["chunk_count"])
+    return {d["_id"]: d["_source"].get("chunk_count") for d in resp["docs"] if d.get("found")}
+
+# -----------------------------
+# Bulk submission
+# -----------------------------
+def submit_actions(actions, label):
     """
-    Index a raw GitHub issue or PR payload immediately.
-    Called directly from the webhook handler.
+    Send every action in one bulk request and report per-item failures.
+    Returns the number of failed items.
     """
+    _, errors = helpers.bulk(
+        es, actions, chunk_size=max(1, len(actions)),
+        raise_on_error=False, raise_on_exception=False
+    )
+    for item in errors:
+        op_type, info = next(iter(item.items()))
+        print(f"Indexing {label} failed for {info.get('_id')}: {info.get('error')}")
+    return len(errors)
+
+# -----------------------------
+# Issue / PR / comment writes
+# -----------------------------
+def _issue_doc(issue_data):
     is_pr  = "pull_request" in issue_data or issue_data.get("type") == "pr"
     doc_id = f"{'pr' if is_pr else 'issue'}-{issue_data['number']}"
 
@@ -54,41 +107,90 @@ def index_issue(issue_data):
         "number":     issue_data["number"],
         "indexed_at": datetime.utcnow().isoformat()
     }
+    combined = f"{doc['title']} {doc['body']}".strip()
+    chunks   = chunk_text(combined) if combined else []
+    doc["chunk_count"] = len(chunks)
+    return doc_id, doc, chunks
 
-    # Index the main document — pipeline auto-embeds it
-    es.index(index=INDEX, id=doc_id, document=doc)
+def issue_chunk_ids(issue_data, previous):
+    """
+    Chunk ids to look up before re-indexing: the new chunks plus any tail
+    left from a longer previous version. `previous` is a
+    previous_chunk_counts() map; parents without a recorded count are probed
+    TAIL_PROBE ids past the new end.
+    """
+    doc_id, _, chunks = _issue_doc(issue_data)
+    count = previous.get(doc_id)
+    total = max(len(chunks), count if count is not None else len(chunks) + TAIL_PROBE)
+    return [f"{doc_id}-chunk-{i}" for i in range(total)]
 
-    # Index chunks for similarity search
-    combined = f"{doc['title']} {doc['body']}".strip()
-    if combined:
-        chunks = chunk_text(combined)
-        for i, chunk in enumerate(chunks):
-            es.index(
-                index=CHUNK_INDEX,
-                id=f"{doc_id}-chunk-{i}",
-                document={
+def issue_actions(issue_data, stored=None, previous=None):
+    """
+    Bulk actions for a raw GitHub issue or PR payload: the parent document,
+    its chunks, and deletes for chunks past the new end when the text got
+    shorter. Chunks whose text is unchanged only get their metadata
+    refreshed (updates bypass the ELSER pipeline). `stored` / `previous` are
+    prefetched stored_chunk_hashes() / previous_chunk_counts() maps; without
+    them both are looked up here.
+    Returns (doc, actions, reembedded).
+    """
+    doc_id, doc, chunks = _issue_doc(issue_data)
+    if stored is None:
+        if previous is None:
+            previous = previous_chunk_counts(es, [doc_id])
+        stored, _ = stored_chunk_hashes(es, issue_chunk_ids(issue_data, previous))
+
+    # The main document — pipeline auto-embeds it
+    actions    = [{"_index": INDEX, "_id": doc_id, "_source": doc}]
+    reembedded = 0
+
+    # Orphaned tail from a longer previous version
+    prefix = f"{doc_id}-chunk-"
+    for chunk_id in stored:
+        if chunk_id.startswith(prefix) and int(chunk_id[len(prefix):]) >= len(chunks):
+            actions.append({"_op_type": "delete", "_index": CHUNK_INDEX, "_id": chunk_id})
+
+    # Chunks for similarity search
+    if chunks:
+        ids = [f"{doc_id}-chunk-{i}" for i in range(len(chunks))]
+        for i, (chunk_id, chunk) in enumerate(zip(ids, chunks)):
+            content_hash = chunk_hash(doc["title"], chunk)
+            metadata = {
+                "type":         doc["type"],
+                "author":       doc["author"],
+                "labels":       doc["labels"],
+                "url":          doc["url"],
+                "number":       doc["number"],
+                "created_at":   doc["created_at"],
+                "content_hash": content_hash
+            }
+            if stored.get(chunk_id) == content_hash:
+                actions.append({
+                    "_op_type": "update", "_index": CHUNK_INDEX, "_id": chunk_id, "doc": metadata
+                })
+                continue
+
+            reembedded += 1
+            actions.append({
+                "_index": CHUNK_INDEX,
+                "_id":    chunk_id,
+                "_source": {
                     "parent_doc_id": doc_id,
                     "chunk_index":   i,
-                    "type":          doc["type"],
-                    "author":        doc["author"],
-                    "labels":        doc["labels"],
-                    "status":        doc["status"],
-                    "url":           doc["url"],
-                    "number":        doc["number"],
-                    "created_at":    doc["created_at"],
                     "title":         doc["title"],
-                    "body":          chunk
+                    "body":          chunk,
+                    **metadata
                 }
-            )
-    print(f"Indexed {doc['type']} #{doc['number']} in real time")
+            })
 
-def index_comment(comment_data, issue_number):
-    """Index a new review comment immediately."""
+    return doc, actions, reembedded
+
+def comment_actions(comment_data, issue_number):
     doc_id = f"comment-{comment_data['id']}"
-    es.index(
-        index=INDEX,
-        id=doc_id,
-        document={
+    return [{
+        "_index": INDEX,
+        "_id":    doc_id,
+        "_source": {
             "id":         str(comment_data["id"]),
             "type":       "comment",
             "body":       comment_data.get("body", "") or "",
@@ -103,33 +205,45 @@ def index_comment(comment_data, issue_number):
             "number":     issue_number,
             "indexed_at": datetime.utcnow().isoformat()
         }
+    }]
+
+def index_issue(issue_data):
+    """
+    Index a raw GitHub issue or PR payload immediately, parent and chunks in
+    one bulk request. Called directly from the webhook handler.
+    """
+    doc, actions, reembedded = issue_actions(issue_data)
+    failed = submit_actions(actions, f"{doc['type']} #{doc['number']}")
+    print(
+        f"Indexed {doc['type']} #{doc['number']} in real time "
+        f"({reembedded} chunks re-embedded, {failed} failed)"
     )
 
+def index_comment(comment_data, issue_number):
+    """Index a new review comment immediately."""
+    submit_actions(comment_actions(comment_data, issue_number), f"comment on #{issue_number}")
+
+def status_actions(number, doc_type, new_status):
+    return [{
+        "_op_type": "update",
+        "_index":   INDEX,
+        "_id":      f"{doc_type}-{number}",
+        "doc": {
+            "status":     new_status,
+            "updated_at": datetime.utcnow().isoformat()
+        }
+    }]
+
 def update_status(number, doc_type, new_status):
     """
     Update the status of an issue or PR when it is closed or merged.
-    Called when webhook fires a 'closed' action.
+    Called when webhook fires a 'closed' action. Only the parent document
+    changes; chunk readers resolve status from it (tools/parent_status.py).
     """
     doc_id = f"{doc_type}-{number}"
     try:
-        es.update(
-            index=INDEX,
-            id=doc_id,
-            body={"doc": {
-                "status":     new_status,
-                "updated_at": datetime.utcnow().isoformat()
-            }}
-        )
-        # Also update all chunk documents for this parent
-        es.update_by_query(
-            index=CHUNK_INDEX,
-            body={
-                "query": {"term": {"parent_doc_id": doc_id}},
-                "script": {
-                    "source": f"ctx._source.status = '{new_status}'"
-                }
-            }
-        )
+        action = status_actions(number, doc_type, new_status)[0]
+        es.update(index=INDEX, id=doc_id, body={"doc": action["doc"]})
         print(f"Updated {doc_type} #{number} status to {new_status}")
     except Exception as e:
         print(f"Status update failed for {doc_type} #{number}: {e}")
@@ -158,3 +272,130 @@ def delete_document(number, doc_type):
         print(f"Deleted {doc_type} #{number} from index ({deleted_chunks} chunks removed)")
     except Exception as e:
         print(f"Delete failed for {doc_type} #{number}: {e}")
+
+# -----------------------------
+# Write-behind queue
+# -----------------------------
+class WriteBehindQueue:
+    """
+    Collects webhook-driven writes for FLUSH_INTERVAL seconds (or until
+    FLUSH_MAX_OPS documents are queued) and sends them as one bulk request
+    from a background thread. Ops are keyed by document, so a later op on the
+    same issue/PR/comment replaces the queued one: a status change folds into
+    a queued re-index, a delete drops whatever was queued before it, and a
+    queued delete absorbs later status changes (only a re-index replaces it).
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL, max_ops=FLUSH_MAX_OPS):
+        self.interval  = interval
+        self.max_ops   = max_ops
+        self._pending  = {}
+        self._cond     = threading.Condition()
+        self._thread   = None
+        self._flushing = False
+        self._closed   = False
+        self.stats     = {"enqueued": 0, "coalesced": 0, "flushes": 0, "actions": 0}
+
+    # ----- producers -----
+    def _put(self, key, op):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            previous = self._pending.pop(key, None)
+            if previous:
+                self.stats["coalesced"] += 1
+                if previous[0] == "issue" and op[0] == "status":
+                    _, (number, doc_type, status) = op
+                    op = ("issue", {**previous[1], "state": status})
+                elif previous[0] == "delete" and op[0] == "status":
+                    # A late status event can't bring a deleted doc back; only a re-create can
+                    op = previous
+            self._pending[key] = op
+            self.stats["enqueued"] += 1
+            self._start()
+            self._cond.notify_all()
+
+    def enqueue_issue(self, issue_data):
+        is_pr = "pull_request" in issue_data or issue_data.get("type") == "pr"
+        self._put(f"{'pr' if is_pr else 'issue'}-{issue_data['number']}", ("issue", issue_data))
+
+    def enqueue_comment(self, comment_data, issue_number):
+        self._put(f"comment-{comment_data['id']}", ("comment", (comment_data, issue_number)))
+
+    def enqueue_status(self, number, doc_type, new_status):
+        self._put(f"{doc_type}-{number}", ("status", (number, doc_type, new_status)))
+
+    def enqueue_delete(self, number, doc_type):
+        self._put(f"{doc_type}-{number}", ("delete", (number, doc_type)))
+
+    # ----- flusher -----
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give a burst a moment to arrive unless the batch is already full
+                self._cond.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.max_ops, self.interval
+                )
+                ops, self._pending = list(self._pending.values()), {}
+                self._flushing = True
+
+            try:
+                self._flush(ops)
+            except Exception as e:
+                print(f"[Write-behind] flush of {len(ops)} ops failed: {e}")
+            finally:
+                with self._cond:
+                    self._flushing = False
+                    self._cond.notify_all()
+
+    def _flush(self, ops):
+        issues   = [args for kind, args in ops if kind == "issue"]
+        previous = previous_chunk_counts(es, [_issue_doc(i)[0] for i in issues])
+        stored, _ = stored_chunk_hashes(
+            es, [cid for i in issues for cid in issue_chunk_ids(i, previous)]
+        )
+
+        actions, deletes = [], []
+        for kind, args in ops:
+            if kind == "issue":
+                actions += issue_actions(args, stored, previous)[1]
+            elif kind == "comment":
+                actions += comment_actions(*args)
+            elif kind == "status":
+                actions += status_actions(*args)
+            elif kind == "delete":
+                deletes.append(args)
+
+        failed = submit_actions(actions, "write-behind batch") if actions else 0
+        for number, doc_type in deletes:
+            delete_document(number, doc_type)
+
+        self.stats["flushes"] += 1
+        self.stats["actions"] += len(actions)
+        print(f"[Write-behind] flushed {len(ops)} ops as {len(actions)} bulk actions ({failed} failed)")
+
+    # ----- lifecycle -----
+    def drain(self, timeout=None):
+        """Block until everything queued so far has been written."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._flushing, timeout)
+
+    def close(self, timeout=30):
+        """Flush what is queued and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+write_queue = WriteBehindQueue()
@@ -1,29 +1,18 @@
 import os
-import requests
-import time
-from elasticsearch import Elasticsearch
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
-from indexing.live_indexer import update_status
+from indexing.live_indexer import update_status, INDEX, CHUNK_INDEX
+from tools.github_client import github_get
+from tools.github_graphql import fetch_statuses
+from tools.rate_limiter import github_priority
 
 load_dotenv()
 
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-REPO         = os.getenv("GITHUB_REPO")
-HEADERS      = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
+REPO = os.getenv("GITHUB_REPO")
 
-ELASTIC_ENDPOINT = os.getenv("ELASTIC_ENDPOINT")
-ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY")
-ELASTIC_CLOUD_ID = os.getenv("ELASTIC_CLOUD_ID")
+es = lazy_client("write")
 
-if ELASTIC_CLOUD_ID:
-    es = Elasticsearch(cloud_id=ELASTIC_CLOUD_ID, api_key=ELASTIC_API_KEY, request_timeout=30)
-elif ELASTIC_ENDPOINT:
-    es = Elasticsearch(ELASTIC_ENDPOINT, api_key=ELASTIC_API_KEY, request_timeout=30)
-else:
-    es = None
+SWEEP_PAGE_SIZE = 1000   # parent_doc_id buckets per composite-aggregation page
 
 def get_stale_open_docs(batch_size=100):
     """
@@ -44,13 +33,10 @@ def verify_github_status(number, doc_type):
     """Check the real current status of an issue or PR on GitHub."""
     endpoint = "pulls" if doc_type == "pr" else "issues"
     url      = f"https://api.github.com/repos/{REPO}/{endpoint}/{number}"
-    resp     = requests.get(url, headers=HEADERS)
+    resp     = github_get(url)
 
     if resp.status_code == 404:
         return "deleted"
-    if resp.status_code == 403:
-        time.sleep(60)
-        return verify_github_status(number, doc_type)
 
     resp.raise_for_status()
     data = resp.json()
@@ -59,7 +45,65 @@ def verify_github_status(number, doc_type):
         return "merged"
     return data.get("state", "open")
 
+def sweep_orphaned_chunks(page_size=SWEEP_PAGE_SIZE):
+    """
+    Delete chunks whose parent document no longer exists. Walks every
+    parent_doc_id in the chunk index with a composite aggregation, checks
+    each page of parents with one mget, and removes the orphans' chunks
+    with one delete_by_query per page.
+    """
+    after   = None
+    parents = 0
+    orphans = 0
+    deleted = 0
+
+    while True:
+        composite = {"size": page_size, "sources": [{"parent": {"terms": {"field": "parent_doc_id"}}}]}
+        if after:
+            composite["after"] = after
+
+        resp = es.search(
+            index=CHUNK_INDEX,
+            body={"size": 0, "aggs": {"parents": {"composite": composite}}}
+        )
+        agg     = resp["aggregations"]["parents"]
+        buckets = agg["buckets"]
+        if not buckets:
+            break
+
+        ids     = [b["key"]["parent"] for b in buckets]
+        found   = es.mget(index=INDEX, ids=ids, _source=False)["docs"]
+        missing = [d["_id"] for d in found if not d.get("found")]
+        parents += len(ids)
+
+        if missing:
+            result = es.delete_by_query(
+                index=CHUNK_INDEX,
+                body={"query": {"terms": {"parent_doc_id": missing}}},
+                conflicts="proceed"
+            )
+            orphans += len(missing)
+            deleted += result.get("deleted", 0)
+
+        after = agg.get("after_key")
+        if not after:
+            break
+
+    print(f"Orphan sweep: {parents} parents checked, {orphans} missing, {deleted} chunks deleted")
+    return orphans, deleted
+
 def run_reconcile(batch_size=100):
+    # Lowest scheduled priority: webhooks and the sync loop go first
+    with github_priority("reconcile"):
+        result = _reconcile(batch_size)
+
+    try:
+        sweep_orphaned_chunks()
+    except Exception as e:
+        print(f"Orphan sweep failed: {e}")
+    return result
+
+def _reconcile(batch_size):
     print("Starting nightly reconcile...")
     stale_docs = get_stale_open_docs(batch_size)
     print(f"Checking {len(stale_docs)} open documents against GitHub...")
@@ -68,13 +112,22 @@ def run_reconcile(batch_size=100):
     confirmed  = 0
     errors     = 0
 
+    # One aliased GraphQL query per 50 items instead of one REST call per item
+    try:
+        batched = fetch_statuses([doc["_source"]["number"] for doc in stale_docs])
+    except Exception as e:
+        print(f"  Batched status lookup failed ({e}), falling back to REST")
+        batched = {}
+
     for doc in stale_docs:
         src    = doc["_source"]
         number = src["number"]
         dtype  = src["type"]
 
         try:
-            real_status = verify_github_status(number, dtype)
+            real_status = batched.get(number)
+            if real_status is None:
+                real_status = verify_github_status(number, dtype)
 
             if real_status != "open":
                 update_status(number, dtype, real_status)
@@ -83,8 +136,6 @@ def run_reconcile(batch_size=100):
             else:
                 confirmed += 1
 
-            time.sleep(0.1)   # gentle rate limiting
-
         except Exception as e:
             print(f"  Error checking {dtype} #{number}: {e}")
             errors += 1
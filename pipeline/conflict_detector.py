@@ -1,18 +1,12 @@
 import os
 import re
-import requests
 from itertools import combinations
 from dotenv import load_dotenv
+from tools.github_client import github_paginate
 
 load_dotenv()
 
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-REPO         = os.getenv("GITHUB_REPO")
-
-HEADERS = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
+REPO = os.getenv("GITHUB_REPO")
 
 # Conflicting signal pairs — if one reviewer says A and another says B
 # in the same PR, that is a conflict worth resolving
@@ -37,16 +31,12 @@ CONFLICT_PATTERNS = [
 def fetch_pr_review_comments(pr_number):
     """Fetch all review comments on a PR."""
     url    = f"https://api.github.com/repos/{REPO}/pulls/{pr_number}/comments"
-    resp   = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    return resp.json()
+    return list(github_paginate(url))
 
 def fetch_pr_issue_comments(pr_number):
     """Fetch general issue-style comments on the PR."""
     url    = f"https://api.github.com/repos/{REPO}/issues/{pr_number}/comments"
-    resp   = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    return resp.json()
+    return list(github_paginate(url))
 
 def get_all_reviewer_comments(pr_number):
     """Combine and deduplicate all comments, grouped by reviewer."""
@@ -1,23 +1,11 @@
-import os
-import requests
 from datetime import datetime
-from elasticsearch import Elasticsearch
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
+from tools.github_graphql import count_merged_prs
 
 load_dotenv()
 
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-REPO         = os.getenv("GITHUB_REPO")
-
-es = Elasticsearch(
-    os.getenv("ELASTIC_ENDPOINT"),
-    api_key=os.getenv("ELASTIC_API_KEY")
-)
-
-HEADERS = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
+es = lazy_client("search")
 
 CONTRIBUTOR_INDEX = "contributor-history"
 
@@ -83,20 +71,9 @@ def check_github_contribution_history(username):
     More reliable than just our local index for the first run.
     """
     try:
-        url    = f"https://api.github.com/repos/{REPO}/pulls"
-        params = {
-            "state":     "closed",
-            "per_page":  10
-        }
-        resp   = requests.get(url, headers=HEADERS, params=params, timeout=30)
-        resp.raise_for_status()
-
-        merged_by_user = [
-            pr for pr in resp.json()
-            if pr.get("user", {}).get("login") == username
-            and pr.get("merged_at") is not None
-        ]
-        return len(merged_by_user)
+        # GraphQL search counts every merged PR by this author, not just
+        # those in the most recent page of closed PRs
+        return count_merged_prs(username)
     except Exception as e:
         print(f"GitHub API check failed: {e}")
         return 0  # Assume first-time if we can't verify
@@ -23,17 +23,11 @@ from agents.agent2_architecture_critic import review_pr
 from agents.agent3_impact_quantifier   import assess_pr_impact
 from agents.agent4_conflict_resolver   import resolve_pr_conflicts
 from pipeline.contributor_checker      import is_first_time_contributor
-from tools.doc_linker                  import get_relevant_docs
+from pipeline.pr_context               import PRContext
 from tools.welcome_composer            import compose_welcome_comment, compose_quality_report_comment
+from tools.github_client               import github_post
 
-import requests
-
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-REPO         = os.getenv("GITHUB_REPO")
-HEADERS_GH   = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
+REPO = os.getenv("GITHUB_REPO")
 
 # ----------------------------------------------------------------
 # Result collector — everything gets stored here for metrics
@@ -99,12 +93,13 @@ def run_issue_pipeline(issue_number):
     Runs: Agent 1 (context retrieval + duplicate check)
     """
     result = PipelineResult("issue", issue_number)
+    ctx    = PRContext(issue_number)
     log.info(f"Starting issue pipeline for #{issue_number}")
 
     # Agent 1
     with Timer() as t:
         try:
-            agent1_output = process_issue(issue_number, is_pr=False)
+            agent1_output = process_issue(issue_number, is_pr=False, context=ctx)
             result.add_step(
                 "Agent 1: Context Retriever",
                 t.elapsed_ms,
@@ -126,17 +121,14 @@ def run_pr_pipeline(pr_number, username=None, pr_title=None, is_first_time=False
     Runs: Agent 1 → Agent 2 → Agent 3 → Welcome Bot (if first-time)
     """
     result = PipelineResult("pr", pr_number)
+    ctx    = PRContext(pr_number)   # fetched once, shared by every agent below
     log.info(f"Starting PR pipeline for #{pr_number}")
 
     # Fetch PR metadata if not provided
     if not username or not pr_title:
         try:
-            pr_data  = requests.get(
-                f"https://api.github.com/repos/{REPO}/pulls/{pr_number}",
-                headers=HEADERS_GH
-            ).json()
-            username  = username  or pr_data["user"]["login"]
-            pr_title  = pr_title  or pr_data["title"]
+            username  = username  or ctx.item["user"]["login"]
+            pr_title  = pr_title  or ctx.item["title"]
         except Exception as e:
             log.warning(f"Could not fetch PR metadata: {e}")
             username = username or "unknown"
@@ -146,7 +138,7 @@ def run_pr_pipeline(pr_number, username=None, pr_title=None, is_first_time=False
     agent1_output = None
     with Timer() as t:
         try:
-            agent1_output = process_issue(pr_number, is_pr=True)
+            agent1_output = process_issue(pr_number, is_pr=True, context=ctx)
             result.add_step(
                 "Agent 1: Context Retriever",
                 t.elapsed_ms,
@@ -161,7 +153,7 @@ def run_pr_pipeline(pr_number, username=None, pr_title=None, is_first_time=False
     agent2_output = None
     with Timer() as t:
         try:
-            agent2_output = review_pr(pr_number, post_comment=True, prior_context=agent1_output)
+            agent2_output = review_pr(pr_number, post_comment=True, prior_context=agent1_output, context=ctx)
             violations    = _count_violations(agent2_output)
             result.add_step(
                 "Agent 2: Architecture Critic",
@@ -182,7 +174,7 @@ def run_pr_pipeline(pr_number, username=None, pr_title=None, is_first_time=False
         prior_for_agent3 += f"## Agent 2 (Architecture Critic) Findings:\n{agent2_output[:800]}\n"
     with Timer() as t:
         try:
-            agent3_output = assess_pr_impact(pr_number, post_comment=True, prior_context=prior_for_agent3 or None)
+            agent3_output = assess_pr_impact(pr_number, post_comment=True, prior_context=prior_for_agent3 or None, context=ctx)
             risk_level    = _extract_risk_level(agent3_output)
             result.add_step(
                 "Agent 3: Impact Quantifier",
@@ -199,7 +191,7 @@ def run_pr_pipeline(pr_number, username=None, pr_title=None, is_first_time=False
     if is_first_time:
         with Timer() as t:
             try:
-                _run_welcome_bot(pr_number, username, pr_title)
+                _run_welcome_bot(ctx, username, pr_title)
                 result.add_step(
                     "Welcome Bot",
                     t.elapsed_ms,
@@ -219,13 +211,14 @@ def run_conflict_pipeline(pr_number):
     Runs: Agent 1 (context) → Agent 4 (Conflict Resolver)
     """
     result = PipelineResult("conflict", pr_number)
+    ctx    = PRContext(pr_number)
     log.info(f"Starting conflict pipeline for #{pr_number}")
 
     # Agent 1 — Context Retriever (gather context for Agent 4)
     agent1_output = None
     with Timer() as t:
         try:
-            agent1_output = process_issue(pr_number, is_pr=True)
+            agent1_output = process_issue(pr_number, is_pr=True, context=ctx)
             result.add_step(
                 "Agent 1: Context Retriever",
                 t.elapsed_ms,
@@ -239,7 +232,7 @@ def run_conflict_pipeline(pr_number):
     # Agent 4 — Conflict Resolver (receives Agent 1 context)
     with Timer() as t:
         try:
-            agent4_output  = resolve_pr_conflicts(pr_number, post_comment=True, prior_context=agent1_output)
+            agent4_output  = resolve_pr_conflicts(pr_number, post_comment=True, prior_context=agent1_output, context=ctx)
             conflict_count = _count_conflicts(agent4_output)
             result.add_step(
                 "Agent 4: Conflict Resolver",
@@ -258,18 +251,18 @@ def run_conflict_pipeline(pr_number):
 # Internal helpers
 # ----------------------------------------------------------------
 
-def _run_welcome_bot(pr_number, username, pr_title):
-    base = "http://localhost:8000"
-    context = requests.post(f"{base}/internal/get-pr-context",
-        json={"pr_number": pr_number}).json()
-    requests.post(f"{base}/internal/post-welcome", json={
-        "pr_number":      pr_number,
-        "username":       username,
-        "pr_title":       pr_title,
-        "similar_issues": context.get("similar_issues", []),
-        "code_owners":    context.get("code_owners", []),
-        "relevant_docs":  context.get("relevant_docs", [])
-    })
+def _run_welcome_bot(ctx, username, pr_title):
+    comment = compose_welcome_comment(
+        username       = username,
+        pr_number      = ctx.number,
+        pr_title       = pr_title,
+        similar_issues = ctx.similar_issues,
+        code_owners    = ctx.owners,
+        relevant_docs  = ctx.docs,
+        is_first_time  = True
+    )
+    resp = github_post(f"https://api.github.com/repos/{REPO}/issues/{ctx.number}/comments", {"body": comment})
+    resp.raise_for_status()
 
 def _summarize(text, max_len=120):
     if not text:
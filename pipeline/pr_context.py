@@ -0,0 +1,145 @@
+import os
+import threading
+import requests
+from dotenv import load_dotenv
+from tools.es_client           import lazy_client
+from tools.github_client       import github_get, github_paginate
+from tools.diff_parser         import pr_diff_key, fetch_pr_diff, fetch_pr_chunks
+from tools.codeowners          import fetch_codeowners, parse_codeowners, get_owners_for_files
+from tools.doc_linker          import get_relevant_docs
+from pipeline.conflict_detector import get_all_reviewer_comments
+
+load_dotenv()
+
+REPO  = os.getenv("GITHUB_REPO")
+INDEX = "elastic-copilot"
+
+es = lazy_client("search")
+
+SIMILAR_FIELDS = ["title", "url", "type", "number", "status", "author"]
+
+# ----------------------------------------------------------------
+# Per-run PR context
+# ----------------------------------------------------------------
+
+class PRContext:
+    """
+    Everything the pipeline reads about one issue or PR, shared by all the
+    agents of a run. Each field is fetched the first time it is read and
+    kept, so a run downloads the diff once and an issue run never does.
+    Safe to read from several threads.
+    """
+
+    def __init__(self, number):
+        self.number  = number
+        self._lock   = threading.RLock()
+        self._values = {}
+
+    def _get(self, name, fetch):
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = fetch()
+            return self._values[name]
+
+    # ----- GitHub -----
+    @property
+    def item(self):
+        """The issues API payload; for a PR it carries a `pull_request` key."""
+        return self._get("item", self._fetch_item)
+
+    @property
+    def is_pr(self):
+        return "pull_request" in self.item
+
+    @property
+    def files(self):
+        """Filenames changed by the PR, [] for an issue."""
+        return self._get("files", self._fetch_files)
+
+    @property
+    def diff_shas(self):
+        """(base, head) SHAs the diff is cached under, read once so every agent sees one diff."""
+        return self._get("diff_shas", lambda: pr_diff_key(self.number))
+
+    @property
+    def diff(self):
+        return self._get("diff", lambda: fetch_pr_diff(self.number, self.diff_shas))
+
+    @property
+    def chunks(self):
+        return self._get("chunks", lambda: fetch_pr_chunks(self.number, self.diff_shas))
+
+    @property
+    def reviewer_comments(self):
+        return self._get("reviewer_comments", lambda: get_all_reviewer_comments(self.number))
+
+    # ----- derived -----
+    @property
+    def owners(self):
+        return self._get("owners", self._fetch_owners)
+
+    @property
+    def docs(self):
+        return self._get("docs", lambda: get_relevant_docs(self.files))
+
+    @property
+    def similar_issues(self):
+        return self._get("similar_issues", self._fetch_similar)
+
+    def to_dict(self):
+        """The /internal/get-pr-context response."""
+        return {
+            "files":          self.files,
+            "code_owners":    self.owners,
+            "relevant_docs":  self.docs,
+            "similar_issues": self.similar_issues,
+            "item_type":      "pr" if self.is_pr else "issue",
+        }
+
+    # ----- fetchers -----
+    def _fetch_item(self):
+        r = github_get(f"https://api.github.com/repos/{REPO}/issues/{self.number}")
+        r.raise_for_status()
+        return r.json()
+
+    def _fetch_files(self):
+        if not self.is_pr:
+            return []
+        url = f"https://api.github.com/repos/{REPO}/pulls/{self.number}/files"
+        try:
+            return [f["filename"] for f in github_paginate(url)]
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            print(f"  PR #{self.number} not found, skipping file lookup")
+            return []
+
+    def _fetch_owners(self):
+        if not self.files:
+            return []
+        try:
+            return get_owners_for_files(self.files, parse_codeowners(fetch_codeowners()))
+        except Exception as e:
+            print(f"CODEOWNERS lookup failed: {e}")
+            return []
+
+    def _fetch_similar(self):
+        query_text = f"{self.item.get('title', '')}\n{self.item.get('body') or ''}".strip()
+        if not es or not query_text:
+            return []
+        try:
+            result = es.search(
+                index=INDEX,
+                size=5,
+                query={
+                    "bool": {
+                        "must":     [{"multi_match": {"query": query_text, "fields": ["title^3", "body"]}}],
+                        "must_not": [{"term": {"number": self.number}}]
+                    }
+                },
+                _source=SIMILAR_FIELDS
+            )
+            return [h.get("_source", {}) for h in result["hits"]["hits"]]
+        except Exception as e:
+            print(f"Similar issue lookup failed: {e}")
+            return []
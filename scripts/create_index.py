@@ -24,7 +24,8 @@ mapping = {
             "updated_at": { "type": "date" },
             "url":        { "type": "keyword" },
             "number":     { "type": "integer" },
-            "parent_id":  { "type": "keyword" }
+            "parent_id":  { "type": "keyword" },
+            "chunk_count": { "type": "integer" }   # chunks last written for this doc
         }
     }
 }
@@ -1,13 +1,9 @@
-import os
-from elasticsearch import Elasticsearch
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
-es = Elasticsearch(
-    os.getenv("ELASTIC_ENDPOINT"),
-    api_key=os.getenv("ELASTIC_API_KEY")
-)
+es = lazy_client("search")
 
 def get_module_for_file(file_path):
     """Map a changed file path to its benchmark module."""
@@ -1,36 +1,22 @@
 import os
 import re
-import requests
 import base64
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import helpers
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
+from tools.github_client import github_get
 
 load_dotenv()
 
 # -----------------------------
 # Environment
 # -----------------------------
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 REPO         = os.getenv("GITHUB_REPO")
 
-ELASTIC_ENDPOINT = os.getenv("ELASTIC_ENDPOINT")
-ELASTIC_API_KEY  = os.getenv("ELASTIC_API_KEY")
-
-# -----------------------------
-# Elasticsearch (API key auth)
-# -----------------------------
-es = Elasticsearch(
-    ELASTIC_ENDPOINT,
-    api_key=ELASTIC_API_KEY
-)
-
 # -----------------------------
-# GitHub headers
+# Elasticsearch (shared client)
 # -----------------------------
-HEADERS = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
+es = lazy_client("search")
 
 CODEOWNERS_INDEX = "codeowners"
 
@@ -43,7 +29,7 @@ def fetch_codeowners():
 
     for path in paths:
         url = f"https://api.github.com/repos/{REPO}/contents/{path}"
-        resp = requests.get(url, headers=HEADERS)
+        resp = github_get(url)
 
         if resp.status_code == 200:
             content = base64.b64decode(resp.json()["content"]).decode("utf-8")
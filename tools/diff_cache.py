@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Raw and parsed PR diffs on disk, addressed by the base/head SHA pair they
+# were computed from. A diff for a given pair never changes, so entries are
+# never revalidated — only evicted, least recently used first, once the
+# directory grows past DIFF_CACHE_MAX_MB. Shared by every process on the
+# machine; reads bump the file's mtime, which is the LRU clock.
+CACHE_DIR = Path(os.getenv(
+    "DIFF_CACHE_DIR",
+    Path(__file__).resolve().parent.parent / ".cache" / "diffs"
+))
+MAX_BYTES = int(os.getenv("DIFF_CACHE_MAX_MB", "512")) * 1024 * 1024
+EVICT_TO  = 0.8          # evict down to this fraction of MAX_BYTES
+
+_lock  = threading.Lock()
+_size  = None            # bytes on disk, scanned on first write
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def diff_key(base_sha, head_sha):
+    return hashlib.sha256(f"{base_sha}...{head_sha}".encode()).hexdigest()
+
+def _path(key, kind):
+    return CACHE_DIR / key[:2] / f"{key}.{kind}"
+
+def _entries():
+    for path in CACHE_DIR.glob("*/*"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:   # evicted by another process
+            continue
+        yield path, st
+
+# -----------------------------
+# Read / write
+# -----------------------------
+def get(key, kind):
+    """The stored bytes for (key, kind), or None."""
+    path = _path(key, kind)
+    try:
+        data = path.read_bytes()
+        os.utime(path)
+    except FileNotFoundError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    with _lock:
+        _stats["hits"] += 1
+    return data
+
+def put(key, kind, data):
+    global _size
+    path = _path(key, kind)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)   # readers see the whole file or none of it
+
+    with _lock:
+        if _size is None:
+            _size = sum(st.st_size for _, st in _entries())
+        else:
+            _size += len(data)
+        if _size > MAX_BYTES:
+            _evict()
+
+def _evict():
+    """Drop least recently used files until under EVICT_TO * MAX_BYTES. Holds _lock."""
+    global _size
+    entries = sorted(_entries(), key=lambda e: e[1].st_mtime)
+    _size   = sum(st.st_size for _, st in entries)
+    target  = MAX_BYTES * EVICT_TO
+    for path, st in entries:
+        if _size <= target:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        _size -= st.st_size
+        _stats["evictions"] += 1
+
+def cached_text(key, kind, build):
+    """The text stored under (key, kind); on a miss, build() it and store it."""
+    data = get(key, kind)
+    if data is not None:
+        return data.decode("utf-8")
+    text = build()
+    put(key, kind, text.encode("utf-8"))
+    return text
+
+def cached_json(key, kind, build):
+    """cached_text for JSON-serialisable values, such as parsed diffs."""
+    data = get(key, kind)
+    if data is not None:
+        return json.loads(data)
+    value = build()
+    put(key, kind, json.dumps(value).encode("utf-8"))
+    return value
+
+def stats():
+    """Hit/miss/eviction counters for this process and the bytes on disk."""
+    with _lock:
+        return {**_stats, "bytes": _size, "max_bytes": MAX_BYTES}
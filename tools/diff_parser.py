@@ -1,24 +1,66 @@
 import os
 import re
-import requests
 from dotenv import load_dotenv
+from tools import diff_cache
+from tools.github_client import github_get, DIFF_ACCEPT
 
 load_dotenv()
 
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-REPO         = os.getenv("GITHUB_REPO")
+REPO = os.getenv("GITHUB_REPO")
 
-HEADERS = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github.v3.diff"   # raw diff format
-}
-
-def fetch_pr_diff(pr_number):
-    url  = f"https://api.github.com/repos/{REPO}/pulls/{pr_number}"
-    resp = requests.get(url, headers=HEADERS)
+# -----------------------------
+# Fetching (through the diff cache)
+# -----------------------------
+def pr_diff_key(pr_number):
+    """
+    Cache key for the PR's current diff: its base and head SHAs. The PR
+    lookup is a conditional request, so an unchanged PR costs no quota.
+    """
+    resp = github_get(f"https://api.github.com/repos/{REPO}/pulls/{pr_number}")
+    resp.raise_for_status()
+    pr = resp.json()
+    return pr["base"]["sha"], pr["head"]["sha"]
+
+def _download_diff(pr_number, base_sha, head_sha):
+    # The compare diff is fixed by the SHA pair, so it can't race a push the
+    # way the PR's own diff endpoint can; that one is the fallback for heads
+    # the base repo can't resolve
+    url  = f"https://api.github.com/repos/{REPO}/compare/{base_sha}...{head_sha}"
+    resp = github_get(url, accept=DIFF_ACCEPT, use_cache=False)
+    if resp.status_code == 404:
+        url  = f"https://api.github.com/repos/{REPO}/pulls/{pr_number}"
+        resp = github_get(url, accept=DIFF_ACCEPT, use_cache=False)
     resp.raise_for_status()
     return resp.text
 
+def fetch_pr_diff(pr_number, shas=None):
+    """Raw diff of a PR. `shas` is a pr_diff_key() result the caller already has."""
+    base_sha, head_sha = shas or pr_diff_key(pr_number)
+    return diff_cache.cached_text(
+        diff_cache.diff_key(base_sha, head_sha), "diff",
+        lambda: _download_diff(pr_number, base_sha, head_sha)
+    )
+
+def fetch_pr_chunks(pr_number, shas=None):
+    """parse_diff_into_chunks of the PR's diff, cached alongside the raw diff."""
+    shas = shas or pr_diff_key(pr_number)
+    return diff_cache.cached_json(
+        diff_cache.diff_key(*shas), "chunks.json",
+        lambda: parse_diff_into_chunks(fetch_pr_diff(pr_number, shas))
+    )
+
+def fetch_pr_file_diffs(pr_number, shas=None):
+    """parse_diff_into_files of the PR's diff, cached alongside the raw diff."""
+    shas = shas or pr_diff_key(pr_number)
+    return diff_cache.cached_json(
+        diff_cache.diff_key(*shas), "files.json",
+        lambda: parse_diff_into_files(fetch_pr_diff(pr_number, shas))
+    )
+
+# -----------------------------
+# Parsing
+# -----------------------------
+
 def parse_diff_into_chunks(diff_text, max_chunk_lines=60):
     """
     Split a raw git diff into per-file chunks.
@@ -53,6 +95,47 @@ def parse_diff_into_chunks(diff_text, max_chunk_lines=60):
 
     return chunks
 
+def parse_diff_into_files(diff_text):
+    """
+    Split a raw git diff into per-file entries for the dashboard: the file's
+    unified diff with its addition and deletion counts.
+    """
+    files         = []
+    current_file  = None
+    added_lines   = 0
+    removed_lines = 0
+    all_lines     = []   # unified view
+
+    for line in diff_text.splitlines():
+        if line.startswith("diff --git"):
+            if current_file:
+                files.append({
+                    "file":      current_file,
+                    "additions": added_lines,
+                    "deletions": removed_lines,
+                    "diff":      "\n".join(all_lines)
+                })
+            current_file  = line.split(" b/")[-1]
+            added_lines   = 0
+            removed_lines = 0
+            all_lines     = []
+        elif current_file:
+            all_lines.append(line)
+            if line.startswith("+") and not line.startswith("+++"):
+                added_lines += 1
+            elif line.startswith("-") and not line.startswith("---"):
+                removed_lines += 1
+
+    if current_file:
+        files.append({
+            "file":      current_file,
+            "additions": added_lines,
+            "deletions": removed_lines,
+            "diff":      "\n".join(all_lines)
+        })
+
+    return files
+
 def extract_code_patterns(added_code):
     """
     Lightweight static pattern extraction before sending to the agent.
@@ -87,8 +170,7 @@ if __name__ == "__main__":
     import sys
     pr_number = int(sys.argv[1]) if len(sys.argv) > 1 else 95103
     print(f"Fetching diff for PR #{pr_number}...")
-    diff = fetch_pr_diff(pr_number)
-    chunks = parse_diff_into_chunks(diff)
+    chunks = fetch_pr_chunks(pr_number)
     print(f"Parsed {len(chunks)} file chunks")
     for c in chunks[:3]:
         hints = extract_code_patterns(c["added_code"])
@@ -1,14 +1,10 @@
-import os
 import requests
-from elasticsearch import Elasticsearch
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
-es = Elasticsearch(
-    os.getenv("ELASTIC_ENDPOINT"),
-    api_key=os.getenv("ELASTIC_API_KEY")
-)
+es = lazy_client("search")
 
 # Curated map of module paths to relevant documentation
 # These are real Elastic docs URLs
@@ -0,0 +1,106 @@
+import os
+import threading
+from elasticsearch import Elasticsearch, AsyncElasticsearch
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# -----------------------------
+# Environment
+# -----------------------------
+ELASTIC_CLOUD_ID = os.getenv("ELASTIC_CLOUD_ID")
+ELASTIC_ENDPOINT = os.getenv("ELASTIC_ENDPOINT")
+ELASTIC_API_KEY  = os.getenv("ELASTIC_API_KEY")
+
+# Keep-alive connections per Elasticsearch node, shared by every module
+CONNECTIONS_PER_NODE = int(os.getenv("ELASTIC_CONNECTIONS_PER_NODE", "32"))
+
+# Request timeouts (seconds) by kind of call site
+TIMEOUTS = {
+    "search": 30,    # agent / API lookups
+    "write":  60,    # single-document and small bulk writes
+    "bulk":   300,   # chunking and crawling bulks through the ELSER pipeline
+}
+
+# -----------------------------
+# Shared clients
+# -----------------------------
+# One sync and one async client per process, created on first use. Call
+# sites get option views of them, which share the client's connection pool.
+_lock         = threading.Lock()
+_client       = None
+_async_client = None
+_views        = {}
+_pid          = None
+
+def configured():
+    return bool(ELASTIC_CLOUD_ID or ELASTIC_ENDPOINT)
+
+def _client_args():
+    if ELASTIC_CLOUD_ID:
+        hosts = {"cloud_id": ELASTIC_CLOUD_ID}
+    elif ELASTIC_ENDPOINT:
+        hosts = {"hosts": ELASTIC_ENDPOINT}
+    else:
+        raise RuntimeError("Elasticsearch is not configured: set ELASTIC_CLOUD_ID or ELASTIC_ENDPOINT")
+    return {
+        **hosts,
+        "api_key":              ELASTIC_API_KEY,
+        "request_timeout":      TIMEOUTS["search"],
+        "connections_per_node": CONNECTIONS_PER_NODE
+    }
+
+def get_es(profile="search"):
+    """The process-wide Elasticsearch client, using `profile`'s request timeout."""
+    global _client, _pid
+    view = _views.get(profile)
+    if view is not None and _pid == os.getpid():
+        return view
+    with _lock:
+        # A forked child must not reuse its parent's sockets
+        if _client is None or _pid != os.getpid():
+            _client = Elasticsearch(**_client_args())
+            _pid    = os.getpid()
+            _views.clear()
+        if profile not in _views:
+            _views[profile] = _client.options(request_timeout=TIMEOUTS[profile])
+        return _views[profile]
+
+def get_async_es():
+    """The process-wide AsyncElasticsearch client, for the backend's event loop."""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = AsyncElasticsearch(**_client_args())
+        return _async_client
+
+async def close_async_es():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+class LazyClient:
+    """
+    Stands in for a module's `es` global so importing the module doesn't
+    connect: the shared client is created on the first request. Truthy only
+    when Elasticsearch is configured.
+    """
+    def __init__(self, profile="search", is_async=False):
+        self._profile  = profile
+        self._is_async = is_async
+
+    def _resolve(self):
+        return get_async_es() if self._is_async else get_es(self._profile)
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __bool__(self):
+        return configured()
+
+def lazy_client(profile="search"):
+    return LazyClient(profile)
+
+def lazy_async_client():
+    return LazyClient(is_async=True)
@@ -0,0 +1,278 @@
+import os
+import re
+import time
+import random
+import sqlite3
+import threading
+import requests
+from pathlib import Path
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.exceptions import ConnectTimeoutError
+from dotenv import load_dotenv
+from tools.github_tokens import read_pool, write_pool
+
+load_dotenv()
+
+JSON_ACCEPT = "application/vnd.github+json"
+DIFF_ACCEPT = "application/vnd.github.v3.diff"
+
+REQUEST_TIMEOUT = 30     # seconds
+MAX_THROTTLE_RETRIES = 5 # rate-limited responses retried after the limiter's pause
+
+# Transient failures (connection errors, timeouts, 502/503/504) are retried
+# with exponential backoff and full jitter
+MAX_RETRIES      = 4
+RETRY_BACKOFF    = 1     # seconds, doubled per attempt
+MAX_BACKOFF      = 30
+RETRY_STATUSES   = (502, 503, 504)
+IDEMPOTENT       = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+POOL_SIZE        = int(os.getenv("GITHUB_POOL_SIZE", "32"))   # keep-alive connections
+
+# Local ETag / Last-Modified store shared by every process on this machine
+CACHE_PATH = Path(os.getenv(
+    "GITHUB_CACHE_PATH",
+    Path(__file__).resolve().parent.parent / ".cache" / "github_cache.sqlite3"
+))
+CACHE_MAX_AGE_DAYS = 7   # entries not revalidated for this long are pruned
+PRUNE_EVERY        = 500 # writes between prune passes
+
+# Response headers worth replaying on a 304 (pagination + content type)
+REPLAYED_HEADERS = ("Link", "Content-Type", "ETag", "Last-Modified")
+
+# -----------------------------
+# SQLite cache
+# -----------------------------
+_db_lock = threading.Lock()
+_db      = None
+_writes  = 0
+_stats   = {"hits": 0, "misses": 0, "uncached": 0}
+
+def _get_db():
+    global _db
+    if _db is None:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _db = sqlite3.connect(str(CACHE_PATH), check_same_thread=False, timeout=30)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                cache_key     TEXT PRIMARY KEY,
+                etag          TEXT,
+                last_modified TEXT,
+                headers       TEXT,
+                body          BLOB,
+                stored_at     REAL
+            )
+        """)
+        _db.commit()
+    return _db
+
+def _cache_key(url, params, accept):
+    query = "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+    return f"{accept} {url}?{query}"
+
+def _load(key):
+    with _db_lock:
+        return _get_db().execute(
+            "SELECT etag, last_modified, headers, body FROM responses WHERE cache_key = ?",
+            (key,)
+        ).fetchone()
+
+def _store(key, resp):
+    global _writes
+    headers = "\n".join(
+        f"{name}: {resp.headers[name]}" for name in REPLAYED_HEADERS if name in resp.headers
+    )
+    with _db_lock:
+        db = _get_db()
+        db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (key, resp.headers.get("ETag"), resp.headers.get("Last-Modified"),
+             headers, resp.content, time.time())
+        )
+        _writes += 1
+        if _writes % PRUNE_EVERY == 0:
+            cutoff = time.time() - CACHE_MAX_AGE_DAYS * 86400
+            db.execute("DELETE FROM responses WHERE stored_at < ?", (cutoff,))
+        db.commit()
+
+def _touch(key):
+    with _db_lock:
+        db = _get_db()
+        db.execute("UPDATE responses SET stored_at = ? WHERE cache_key = ?", (time.time(), key))
+        db.commit()
+
+def _replay(row, url, live_resp):
+    """Rebuild a 200 response from a cached row so callers can't tell the difference."""
+    _, _, headers, body = row
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.url         = url
+    resp._content    = body
+    resp.headers     = CaseInsensitiveDict(
+        line.split(": ", 1) for line in headers.splitlines() if ": " in line
+    )
+    # Keep the fresh rate-limit headers from the 304 itself
+    for name, value in live_resp.headers.items():
+        if name.lower().startswith("x-ratelimit"):
+            resp.headers[name] = value
+    resp.encoding    = "utf-8"
+    resp.from_cache  = True
+    return resp
+
+def cache_stats():
+    """Hit/miss counters for this process — 304 hits did not cost any rate limit."""
+    return dict(_stats)
+
+# -----------------------------
+# Pooled transport
+# -----------------------------
+# Every GitHub call in the process goes out on this session, so connections
+# (and TLS sessions) are reused instead of re-established per request.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE))
+
+_latency_lock = threading.Lock()
+_latency      = {}   # "METHOD /path/template" -> [count, errors, total_ms, max_ms]
+
+def _endpoint(method, url):
+    """Group URLs by endpoint: repo, numbers and file paths become placeholders."""
+    path = urlparse(url).path
+    path = re.sub(r"^/repos/[^/]+/[^/]+", "/repos/:repo", path)
+    path = re.sub(r"/contents/.*$", "/contents/:path", path)
+    path = re.sub(r"/\d+(?=/|$)", "/:n", path)
+    return f"{method} {path}"
+
+def _record(endpoint, elapsed_ms, failed):
+    with _latency_lock:
+        entry = _latency.setdefault(endpoint, [0, 0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += failed
+        entry[2] += elapsed_ms
+        entry[3]  = max(entry[3], elapsed_ms)
+
+def latency_stats():
+    """Per-endpoint request count, error count and average / max latency (ms)."""
+    with _latency_lock:
+        return {
+            endpoint: {
+                "requests": count,
+                "errors":   errors,
+                "avg_ms":   round(total / count, 1),
+                "max_ms":   round(peak, 1)
+            }
+            for endpoint, (count, errors, total, peak) in sorted(_latency.items())
+        }
+
+def _never_sent(error):
+    """True when the request failed while connecting, so GitHub never saw it."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, ConnectTimeoutError)   # includes NewConnectionError / DNS failures
+
+def github_send(method, url, timeout=REQUEST_TIMEOUT, idempotent=None, **kwargs):
+    """
+    Send one request on the shared session, retrying connection errors,
+    timeouts and 502/503/504 with jittered exponential backoff. Requests
+    that aren't idempotent (by default anything but GET/HEAD/PUT/DELETE) are
+    only retried when the connection failed before they were sent: a POST
+    that timed out or got a 5xx may already have created a comment. Rate
+    limits are not handled here; callers pace those with their token's limiter.
+    """
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT
+    endpoint = _endpoint(method, url)
+    for attempt in range(MAX_RETRIES + 1):
+        started = time.time()
+        try:
+            resp = _session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record(endpoint, (time.time() - started) * 1000, True)
+            if attempt == MAX_RETRIES or not (idempotent or _never_sent(e)):
+                raise
+        else:
+            failed = resp.status_code in RETRY_STATUSES
+            _record(endpoint, (time.time() - started) * 1000, failed)
+            if not failed or not idempotent or attempt == MAX_RETRIES:
+                return resp
+        time.sleep(random.uniform(0, min(MAX_BACKOFF, RETRY_BACKOFF * 2 ** attempt)))
+
+# -----------------------------
+# Conditional GET
+# -----------------------------
+def github_get(url, params=None, accept=JSON_ACCEPT, timeout=REQUEST_TIMEOUT, use_cache=True,
+               priority=None):
+    """
+    GET a GitHub API URL, revalidating any cached copy with If-None-Match /
+    If-Modified-Since. A 304 is answered from the local store and does not
+    count against the rate limit. Every request goes out on the read-pool
+    token with the most quota left and waits on that token's limiter at
+    `priority` (default: the caller's github_priority context); rate-limited
+    responses are retried, on another token if one has headroom.
+    Other non-200 responses are returned untouched so callers keep their
+    own 404 handling.
+    """
+    headers = {"Accept": accept}
+
+    key = _cache_key(url, params, accept)
+    row = _load(key) if use_cache else None
+    if row:
+        etag, last_modified, _, _ = row
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    for _ in range(MAX_THROTTLE_RETRIES):
+        token = read_pool.acquire("rest", priority)
+        resp  = github_send(
+            "GET", url, headers={**headers, **token.auth_header()}, params=params, timeout=timeout
+        )
+        if not token.rest.update_from_response(resp):
+            break
+
+    if resp.status_code == 304 and row:
+        token.rest.refund(remaining="X-RateLimit-Remaining" not in resp.headers)
+        _stats["hits"] += 1
+        _touch(key)
+        return _replay(row, resp.url, resp)
+
+    if use_cache and resp.status_code == 200 and (
+        resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+    ):
+        _stats["misses"] += 1
+        _store(key, resp)
+    else:
+        _stats["uncached"] += 1
+
+    return resp
+
+def github_paginate(url, params=None, **kwargs):
+    """
+    Yield every item of a paginated GitHub listing, following `Link: next`.
+    Pages come from github_get (so they are cached and paced like any other
+    read); a non-200 page raises requests.HTTPError.
+    """
+    params = {"per_page": 100, **(params or {})}
+    while url:
+        resp = github_get(url, params, **kwargs)
+        resp.raise_for_status()
+        yield from resp.json()
+        url    = resp.links.get("next", {}).get("url")
+        params = None   # the next link already carries the query
+
+# -----------------------------
+# Writes
+# -----------------------------
+def github_post(url, json, priority=None):
+    """POST to the GitHub API on a write-pool token, retrying rate-limited responses."""
+    for _ in range(MAX_THROTTLE_RETRIES):
+        token = write_pool.acquire("rest", priority)
+        resp  = github_send(
+            "POST", url, headers={"Accept": JSON_ACCEPT, **token.auth_header()}, json=json
+        )
+        if not token.rest.update_from_response(resp):
+            break
+    return resp
@@ -0,0 +1,230 @@
+import os
+from dotenv import load_dotenv
+from tools.github_tokens import read_pool
+from tools.github_client import github_send
+
+load_dotenv()
+
+# -----------------------------
+# Environment
+# -----------------------------
+REPO = os.getenv("GITHUB_REPO")          # owner/repo
+
+GRAPHQL_URL     = "https://api.github.com/graphql"
+REQUEST_TIMEOUT = 60     # seconds
+MAX_THROTTLE_RETRIES = 5
+
+PAGE_SIZE       = 50     # issues/PRs per query
+INLINE_COMMENTS = 20     # most recent comments fetched with each issue/PR
+LOOKUP_BATCH    = 50     # aliased number lookups per query
+
+# -----------------------------
+# Query fragments
+# -----------------------------
+COMMENT_FIELDS = """
+    totalCount
+    nodes { databaseId body createdAt updatedAt url author { login } }
+"""
+
+ISSUE_FIELDS = f"""
+    databaseId number title body state createdAt updatedAt url
+    author {{ login }}
+    labels(first: 50) {{ nodes {{ name }} }}
+    comments(last: $comments) {{ {COMMENT_FIELDS} }}
+"""
+
+PR_FIELDS = ISSUE_FIELDS + """
+    merged mergedAt
+"""
+
+CONNECTION_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String, $comments: Int!%(extra_vars)s) {
+  repository(owner: $owner, name: $name) {
+    %(connection)s(first: $first, after: $after, %(args)s) {
+      pageInfo { hasNextPage endCursor }
+      nodes { %(fields)s }
+    }
+  }
+}
+"""
+
+# -----------------------------
+# Transport
+# -----------------------------
+def graphql_query(query, variables=None, priority=None):
+    """
+    POST a query to the GitHub GraphQL API and return its `data`.
+    NOT_FOUND errors (deleted or transferred items) leave a null in `data`
+    and are not raised; anything else is. `priority` defaults to the
+    caller's github_priority context.
+    """
+    for _ in range(MAX_THROTTLE_RETRIES):
+        token = read_pool.acquire("graphql", priority)
+        resp  = github_send(
+            "POST",
+            GRAPHQL_URL,
+            headers=token.auth_header("bearer"),
+            json={"query": query, "variables": variables or {}},
+            timeout=REQUEST_TIMEOUT,
+            idempotent=True   # queries only read
+        )
+        if not token.graphql.update_from_response(resp):
+            break
+    resp.raise_for_status()
+    payload = resp.json()
+
+    errors = [e for e in payload.get("errors", []) if e.get("type") != "NOT_FOUND"]
+    if errors or payload.get("data") is None:
+        raise RuntimeError(f"GraphQL error: {(errors or payload.get('errors'))[0].get('message')}")
+    return payload["data"]
+
+def _repo_vars():
+    owner, name = REPO.split("/", 1)
+    return {"owner": owner, "name": name}
+
+# -----------------------------
+# GraphQL node -> REST-shaped payload
+# -----------------------------
+# Items come back in the same shape as the REST issues API so the existing
+# index_issue / issue_to_action / comment_to_action helpers work unchanged.
+def _login(node):
+    return (node.get("author") or {}).get("login") or "ghost"
+
+def to_rest_comment(node, issue_number):
+    return {
+        "id":         node["databaseId"],
+        "body":       node.get("body") or "",
+        "user":       {"login": _login(node)},
+        "created_at": node["createdAt"],
+        "updated_at": node["updatedAt"],
+        "html_url":   node["url"],
+        "issue_url":  f"https://api.github.com/repos/{REPO}/issues/{issue_number}"
+    }
+
+def to_rest_item(node):
+    is_pr = "merged" in node
+    item  = {
+        "id":         node["databaseId"],
+        "number":     node["number"],
+        "title":      node.get("title", ""),
+        "body":       node.get("body") or "",
+        "user":       {"login": _login(node)},
+        "labels":     [{"name": l["name"]} for l in node["labels"]["nodes"]],
+        "state":      "open" if node["state"] == "OPEN" else "closed",
+        "created_at": node["createdAt"],
+        "updated_at": node["updatedAt"],
+        "html_url":   node["url"],
+        "comments":   node["comments"]["totalCount"],
+        "recent_comments": [
+            to_rest_comment(c, node["number"]) for c in node["comments"]["nodes"]
+        ]
+    }
+    if is_pr:
+        item["merged_at"]    = node.get("mergedAt")
+        item["pull_request"] = {"merged_at": node.get("mergedAt")}
+    return item
+
+def item_status(item):
+    """open / closed / merged, matching nightly_reconcile.verify_github_status."""
+    if item is None:
+        return "deleted"
+    if item.get("merged_at"):
+        return "merged"
+    return item["state"]
+
+# -----------------------------
+# Paginated issue / PR listings
+# -----------------------------
+def iter_pages(connection, since=None, after=None, page_size=PAGE_SIZE, comments=INLINE_COMMENTS,
+               priority=None):
+    """
+    Yield (end_cursor, items) for `issues` or `pullRequests`, each item carrying
+    its labels, state, merge status and last `comments` comments.
+
+    Without `since` the listing is oldest-created first, which keeps cursors
+    stable for a resumable backfill. With `since` only items updated at or after
+    it are returned: issues filter server-side, PRs (which have no `since`
+    filter) are read newest-updated first and stop at the cutoff.
+    """
+    fields     = PR_FIELDS if connection == "pullRequests" else ISSUE_FIELDS
+    extra_vars = ""
+    if since is None:
+        args = "orderBy: {field: CREATED_AT, direction: ASC}"
+    elif connection == "issues":
+        args       = "orderBy: {field: UPDATED_AT, direction: ASC}, filterBy: {since: $since}"
+        extra_vars = ", $since: DateTime"
+    else:
+        args = "orderBy: {field: UPDATED_AT, direction: DESC}"
+
+    query = CONNECTION_QUERY % {
+        "connection": connection, "args": args, "fields": fields, "extra_vars": extra_vars
+    }
+    variables = {**_repo_vars(), "first": page_size, "comments": comments}
+    if extra_vars:
+        variables["since"] = since
+
+    while True:
+        data  = graphql_query(query, {**variables, "after": after}, priority)
+        conn  = data["repository"][connection]
+        items = [to_rest_item(n) for n in conn["nodes"] if n]
+
+        stop = False
+        if since is not None and connection == "pullRequests":
+            kept  = [i for i in items if i["updated_at"] >= since]
+            stop  = len(kept) < len(items)
+            items = kept
+
+        after = conn["pageInfo"]["endCursor"]
+        yield after, items
+
+        if stop or not conn["pageInfo"]["hasNextPage"]:
+            return
+
+def fetch_updated_items(since, comments=INLINE_COMMENTS):
+    """All issues and PRs updated since `since`, with their most recent comments."""
+    for connection in ("issues", "pullRequests"):
+        for _, items in iter_pages(connection, since=since, comments=comments):
+            yield from items
+
+# -----------------------------
+# Batched lookups by number
+# -----------------------------
+def fetch_items_by_number(numbers, comments=0, batch_size=LOOKUP_BATCH):
+    """
+    Look up many issues/PRs by number with one aliased query per batch.
+    Returns {number: rest_item or None}; None means the item no longer exists.
+    """
+    results = {}
+    numbers = list(dict.fromkeys(numbers))
+
+    for start in range(0, len(numbers), batch_size):
+        batch   = numbers[start:start + batch_size]
+        aliases = "\n".join(
+            f"n{n}: issueOrPullRequest(number: {int(n)}) {{"
+            f" ... on Issue {{ {ISSUE_FIELDS} }}"
+            f" ... on PullRequest {{ {PR_FIELDS} }} }}"
+            for n in batch
+        )
+        query = (
+            "query($owner: String!, $name: String!, $comments: Int!) {"
+            f" repository(owner: $owner, name: $name) {{ {aliases} }} }}"
+        )
+        data = graphql_query(query, {**_repo_vars(), "comments": comments})
+        repo = data["repository"] or {}
+        for n in batch:
+            node = repo.get(f"n{n}")
+            results[n] = to_rest_item(node) if node else None
+
+    return results
+
+def fetch_statuses(numbers):
+    """{number: open|closed|merged|deleted} for a batch of issue/PR numbers."""
+    return {n: item_status(item) for n, item in fetch_items_by_number(numbers).items()}
+
+def count_merged_prs(username):
+    """Number of merged PRs `username` has authored in this repo."""
+    data = graphql_query(
+        "query($q: String!) { search(query: $q, type: ISSUE, first: 1) { issueCount } }",
+        {"q": f"repo:{REPO} is:pr is:merged author:{username}"}
+    )
+    return data["search"]["issueCount"]
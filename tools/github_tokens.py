@@ -0,0 +1,89 @@
+import os
+import hashlib
+import threading
+from dotenv import load_dotenv
+from tools.rate_limiter import RateLimiter
+
+load_dotenv()
+
+# -----------------------------
+# Environment
+# -----------------------------
+# Comma-separated PATs or GitHub App installation tokens. Both pools fall back
+# to GITHUB_TOKEN, so a single-token setup keeps working unchanged.
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+READ_TOKENS  = os.getenv("GITHUB_READ_TOKENS", "")
+WRITE_TOKENS = os.getenv("GITHUB_WRITE_TOKENS", "")
+
+AUTHENTICATED_RATE_PER_HOUR = 5000
+ANONYMOUS_RATE_PER_HOUR     = 60
+
+# -----------------------------
+# Tokens
+# -----------------------------
+class GitHubToken:
+    """One credential with its own REST and GraphQL quota."""
+
+    def __init__(self, token):
+        self.token = token
+        self.label = hashlib.sha256(token.encode()).hexdigest()[:8] if token else "anonymous"
+        rate       = AUTHENTICATED_RATE_PER_HOUR if token else ANONYMOUS_RATE_PER_HOUR
+        self.rest    = RateLimiter(f"rest:{self.label}", rate_per_hour=rate)
+        self.graphql = RateLimiter(f"graphql:{self.label}", rate_per_hour=rate)
+
+    def auth_header(self, scheme="token"):
+        return {"Authorization": f"{scheme} {self.token}"} if self.token else {}
+
+# The same token listed in both pools is one quota, so it gets one set of limiters
+_registry      = {}
+_registry_lock = threading.Lock()
+
+def _get_token(token):
+    with _registry_lock:
+        if token not in _registry:
+            _registry[token] = GitHubToken(token)
+        return _registry[token]
+
+# -----------------------------
+# Pools
+# -----------------------------
+class TokenPool:
+    """
+    Rotates requests across several tokens. Each call goes to the token with
+    the most quota left (as last reported by GitHub), skipping tokens that are
+    currently throttled, and then waits on that token's own limiter.
+    """
+
+    def __init__(self, role, tokens):
+        self.role   = role
+        self.tokens = [_get_token(t) for t in dict.fromkeys(tokens)] or [_get_token(None)]
+
+    def _pick(self, api):
+        return max(self.tokens, key=lambda t: getattr(t, api).headroom())
+
+    def acquire(self, api="rest", priority=None):
+        """Choose a token for one request and wait until its quota allows it."""
+        token = self._pick(api)
+        getattr(token, api).acquire(priority)
+        return token
+
+    def state(self):
+        return {
+            "role":   self.role,
+            "tokens": [
+                {"token": t.label, "rest": t.rest.state(), "graphql": t.graphql.state()}
+                for t in self.tokens
+            ]
+        }
+
+def _split(value):
+    return [t.strip() for t in value.split(",") if t.strip()]
+
+# Read-heavy work (crawler, sync, reconcile, agents) and writes (comment
+# posting) draw from separate pools so a backfill can't starve comment posting
+read_pool  = TokenPool("read",  _split(READ_TOKENS)  or [GITHUB_TOKEN])
+write_pool = TokenPool("write", _split(WRITE_TOKENS) or [GITHUB_TOKEN])
+
+def pool_state():
+    """Per-token quota for both pools, for monitoring."""
+    return {"read": read_pool.state(), "write": write_pool.state()}
@@ -0,0 +1,44 @@
+PARENT_INDEX = "elastic-copilot"
+
+# Chunks don't carry an authoritative status: closing or merging an issue/PR
+# only updates its parent document, and chunk hits are resolved against the
+# parents at read time with one mget.
+
+def _parent_ids(hits):
+    return list(dict.fromkeys(h["_source"].get("parent_doc_id") for h in hits if h["_source"].get("parent_doc_id")))
+
+def _statuses(resp):
+    return {d["_id"]: d["_source"].get("status") for d in resp["docs"] if d.get("found")}
+
+def parent_statuses(client, parent_ids):
+    """{parent_doc_id: status} for the given parents, looked up with one mget."""
+    parent_ids = list(dict.fromkeys(p for p in parent_ids if p))
+    if not parent_ids:
+        return {}
+    return _statuses(client.mget(index=PARENT_INDEX, ids=parent_ids, _source_includes=["status"]))
+
+def _apply(hits, current, statuses):
+    kept = []
+    for hit in hits:
+        src    = hit["_source"]
+        status = current.get(src.get("parent_doc_id"), src.get("status"))
+        if statuses and status not in statuses:
+            continue
+        src["status"] = status
+        kept.append(hit)
+    return kept
+
+def with_parent_status(client, hits, statuses=None):
+    """
+    Set each chunk hit's `status` to its parent's current status. With
+    `statuses`, only hits whose parent is in one of them are kept.
+    """
+    return _apply(hits, parent_statuses(client, _parent_ids(hits)), statuses)
+
+async def with_parent_status_async(client, hits, statuses=None):
+    """with_parent_status for an AsyncElasticsearch client."""
+    ids     = _parent_ids(hits)
+    current = {}
+    if ids:
+        current = _statuses(await client.mget(index=PARENT_INDEX, ids=ids, _source_includes=["status"]))
+    return _apply(hits, current, statuses)
@@ -0,0 +1,250 @@
+import os
+import time
+import sqlite3
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# -----------------------------
+# Priorities
+# -----------------------------
+# Lower value wins. A waiting request only proceeds once nothing of a higher
+# priority is queued, and each level stops spending the server-reported quota
+# at its own reserve so webhooks always have headroom.
+PRIORITIES = {"webhook": 0, "sync": 1, "reconcile": 2, "backfill": 3}
+RESERVES   = {"webhook": 0, "sync": 500, "reconcile": 1000, "backfill": 1000}
+
+DEFAULT_RATE_PER_HOUR = 5000
+DEFAULT_BURST         = 100
+
+# Set to a file path to share one bucket between processes
+# (backend, sync manager, crawler) on the same machine. Relative paths are
+# taken from the repo root, so every process finds the same file.
+SHARED_DB_PATH = os.getenv("GITHUB_RATE_LIMIT_DB")
+if SHARED_DB_PATH:
+    SHARED_DB_PATH = str(Path(__file__).resolve().parent.parent / SHARED_DB_PATH)
+
+_priority = contextvars.ContextVar("github_priority", default="webhook")
+
+@contextmanager
+def github_priority(name):
+    """Run GitHub calls in this block at the given priority (webhook > sync > reconcile > backfill)."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority():
+    return _priority.get()
+
+# -----------------------------
+# Cross-process state
+# -----------------------------
+class SharedState:
+    """Bucket state kept in one SQLite row, updated under BEGIN IMMEDIATE."""
+
+    FIELDS = ("tokens", "updated", "remaining", "reset_at", "blocked_until")
+
+    def __init__(self, path, name):
+        self.name = name
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db   = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY, tokens REAL, updated REAL,
+                remaining INTEGER, reset_at REAL, blocked_until REAL
+            )
+        """)
+
+    @contextmanager
+    def transaction(self, default):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT tokens, updated, remaining, reset_at, blocked_until FROM buckets WHERE name = ?",
+                (self.name,)
+            ).fetchone()
+            state = dict(zip(self.FIELDS, row)) if row else dict(default)
+            yield state
+            self.db.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, *(state[f] for f in self.FIELDS))
+            )
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+# -----------------------------
+# Token bucket
+# -----------------------------
+class RateLimiter:
+    """
+    Token bucket in front of one GitHub quota (REST or GraphQL, per token).
+
+    Tokens refill at the base hourly rate, or faster when the server reports
+    more remaining quota than the base rate would spend before the reset.
+    Responses feed X-RateLimit-Remaining / X-RateLimit-Reset / Retry-After
+    back in, and a throttled response blocks every caller until it clears.
+    """
+
+    def __init__(self, name, rate_per_hour=DEFAULT_RATE_PER_HOUR, burst=DEFAULT_BURST,
+                 shared_path=SHARED_DB_PATH):
+        self.name    = name
+        self.rate    = rate_per_hour / 3600.0
+        self.burst   = burst
+        self._cond   = threading.Condition()
+        self._waiting = {p: 0 for p in PRIORITIES}
+        self._state  = {
+            "tokens": float(burst), "updated": time.time(),
+            "remaining": None, "reset_at": 0.0, "blocked_until": 0.0
+        }
+        self._shared = SharedState(shared_path, name) if shared_path else None
+        self.stats   = {"granted": 0, "waited_s": 0.0, "throttled": 0, "refunded": 0}
+
+    @contextmanager
+    def _locked_state(self):
+        if self._shared:
+            with self._shared.transaction(self._state) as state:
+                yield state
+                self._state = dict(state)
+        else:
+            yield self._state
+
+    def _refill(self, state, now):
+        rate = self.rate
+        if state["remaining"] is not None and state["reset_at"] > now:
+            rate = max(rate, state["remaining"] / (state["reset_at"] - now))
+        state["tokens"]  = min(self.burst, state["tokens"] + (now - state["updated"]) * rate)
+        state["updated"] = now
+        return rate
+
+    def _try_take(self, priority):
+        """Take a token and return 0, or return how long to wait before trying again."""
+        level = PRIORITIES[priority]
+        if any(count for p, count in self._waiting.items() if PRIORITIES[p] < level):
+            return 0.05
+
+        now = time.time()
+        with self._locked_state() as state:
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            if (state["remaining"] is not None and state["reset_at"] > now
+                    and state["remaining"] <= RESERVES[priority]):
+                return state["reset_at"] - now
+
+            rate = self._refill(state, now)
+            if state["tokens"] < 1:
+                return (1 - state["tokens"]) / rate
+
+            state["tokens"] -= 1
+            if state["remaining"] is not None:
+                state["remaining"] -= 1
+            return 0
+
+    def acquire(self, priority=None):
+        """Block until this caller may send one request at its priority."""
+        priority = priority or current_priority()
+        started  = time.time()
+
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    wait = self._try_take(priority)
+                    if wait <= 0:
+                        break
+                    # Re-check at least every second so shared-state changes are seen
+                    self._cond.wait(timeout=min(wait, 1.0))
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+            self.stats["granted"]  += 1
+            self.stats["waited_s"] += time.time() - started
+
+    def refund(self, remaining=True):
+        """
+        Give a token back, e.g. for a 304 that did not count against the quota.
+        Pass remaining=False when the response already reported the server's
+        remaining quota, so the local count isn't bumped past it.
+        """
+        with self._cond:
+            with self._locked_state() as state:
+                state["tokens"] = min(self.burst, state["tokens"] + 1)
+                if remaining and state["remaining"] is not None:
+                    state["remaining"] += 1
+            self.stats["refunded"] += 1
+            self._cond.notify_all()
+
+    def update_from_response(self, resp):
+        """
+        Record the server's view of the quota. Returns True when the response
+        was a rate-limit rejection; every caller is then held back until it
+        clears and the request should be retried.
+        """
+        headers   = resp.headers
+        now       = time.time()
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset     = headers.get("X-RateLimit-Reset")
+        retry     = headers.get("Retry-After")
+
+        throttled = resp.status_code == 429 or (resp.status_code == 403 and (
+            remaining == "0" or retry is not None or "rate limit" in resp.text.lower()
+        ))
+
+        with self._cond:
+            with self._locked_state() as state:
+                if remaining is not None:
+                    state["remaining"] = int(remaining)
+                if reset is not None:
+                    state["reset_at"] = float(reset)
+                if throttled:
+                    if retry is not None:
+                        until = now + int(retry)
+                    elif remaining == "0" and reset is not None:
+                        until = float(reset) + 1
+                    else:
+                        until = now + 60   # secondary limit without a hint
+                    state["blocked_until"] = max(state["blocked_until"], until)
+            if throttled:
+                self.stats["throttled"] += 1
+                print(f"[Rate limit] {self.name} throttled, pausing {int(self._state['blocked_until'] - now)}s")
+            self._cond.notify_all()
+
+        return throttled
+
+    def headroom(self):
+        """Requests this quota can still take: 0 while throttled, the server's count when known."""
+        now = time.time()
+        with self._cond:
+            with self._locked_state() as state:
+                if state["blocked_until"] > now:
+                    return 0
+                if state["remaining"] is not None and state["reset_at"] > now:
+                    return state["remaining"]
+                return self.rate * 3600
+
+    def state(self):
+        """Snapshot for monitoring endpoints."""
+        with self._cond:
+            now = time.time()
+            with self._locked_state() as state:
+                self._refill(state, now)
+                snapshot = dict(state)
+            return {
+                "name":          self.name,
+                "tokens":        round(snapshot["tokens"], 2),
+                "remaining":     snapshot["remaining"],
+                "reset_in_s":    max(0, int(snapshot["reset_at"] - now)) if snapshot["reset_at"] else None,
+                "blocked_for_s": max(0, int(snapshot["blocked_until"] - now)),
+                "waiting":       dict(self._waiting),
+                "shared":        self._shared is not None,
+                **{k: round(v, 2) if isinstance(v, float) else v for k, v in self.stats.items()}
+            }
@@ -1,24 +1,30 @@
-import os
-from elasticsearch import Elasticsearch
+from tools.es_client import lazy_client
 from dotenv import load_dotenv
+from tools.parent_status import with_parent_status
 
 load_dotenv()
 
 # -----------------------------
-# Elasticsearch (API key auth)
+# Elasticsearch (shared client)
 # -----------------------------
-es = Elasticsearch(
-    os.getenv("ELASTIC_ENDPOINT"),
-    api_key=os.getenv("ELASTIC_API_KEY")
-)
+es = lazy_client("search")
 
-def semantic_search(query_text, doc_type=None, top_k=5):
+STATUS_OVERFETCH  = 4       # candidates per result, per page, when filtering by parent status
+MAX_RESULT_WINDOW = 10000   # index.max_result_window: from + size can't go past it
+
+def semantic_search(query_text, doc_type=None, top_k=5, status=None):
+    """
+    ELSER search over the chunk index. Each hit's status comes from its
+    parent issue/PR; pass `status` (a value or list) to keep only hits whose
+    parent currently has it. Ranked hits are paged through until `top_k`
+    match or the hits run out.
+    """
+    statuses = [status] if isinstance(status, str) else status
     filter_clause = []
     if doc_type:
         filter_clause.append({"term": {"type": doc_type}})
 
     query = {
-        "size": top_k,
         "query": {
             "bool": {
                 "should": [
@@ -40,11 +46,21 @@ def semantic_search(query_text, doc_type=None, top_k=5):
                 "filter": filter_clause
             }
         },
-        "_source": ["title", "url", "type", "author", "status", "number"]
+        "_source": ["title", "url", "type", "author", "status", "number", "parent_doc_id"]
     }
 
-    resp = es.search(index="elastic-copilot-chunks", body=query)
-    return resp["hits"]["hits"]
+    page    = top_k * STATUS_OVERFETCH if statuses else top_k
+    results = []
+    offset  = 0
+    while len(results) < top_k and offset < MAX_RESULT_WINDOW:
+        query["from"] = offset
+        query["size"] = min(page, MAX_RESULT_WINDOW - offset)
+        hits = es.search(index="elastic-copilot-chunks", body=query)["hits"]["hits"]
+        results.extend(with_parent_status(es, hits, statuses))
+        if len(hits) < query["size"]:
+            break
+        offset += len(hits)
+    return results[:top_k]
 
 
 if __name__ == "__main__":